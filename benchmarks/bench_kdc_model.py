@@ -0,0 +1,202 @@
+# benchmarks/bench_kdc_model.py
+# 功能：比较旧的dict子类KDC模型（每次访问属性都重新包装子对象）与__slots__模型解析、遍历和渲染大型KDC文档的
+# 耗时和内存峰值。旧的kdc2xml.py从git历史中读取（默认为引入__slots__模型之前的版本），因此需要在仓库中运行，
+# 并且与modules.kdc2xml一样需要能导入requests和streamlit。
+# 用法：python benchmarks/bench_kdc_model.py [--slides 200] [--passes 3] [--repeat 5] [--baseline <提交>]
+
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from modules import kdc2xml
+
+def find_baseline():
+    """
+    找到引入cached_child（__slots__模型）的提交，返回其父提交。
+    """
+    commits = subprocess.run(
+        ['git', 'log', '--format=%H', '-S', 'class cached_child', '--', 'modules/kdc2xml.py'],
+        cwd=ROOT, check=True, capture_output=True, text=True).stdout.split()
+    if not commits:
+        raise RuntimeError("在git历史中找不到引入cached_child的提交，请用--baseline指定旧模型所在的提交。")
+    return f'{commits[-1]}~1'
+
+
+def load_old_model(rev):
+    """
+    从git历史中读取旧的kdc2xml.py并执行（包括其中的渲染器），返回模块命名空间。
+    """
+    source = subprocess.run(['git', 'show', f'{rev}:modules/kdc2xml.py'],
+                            cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    namespace = {'__name__': 'old_kdc2xml'}
+    exec(compile(source, f'{rev}:modules/kdc2xml.py', 'exec'), namespace)
+    return namespace
+
+
+def build_document(slides):
+    """
+    生成以表格为主的合成演示文稿KDC数据：每个slide有段落、嵌套表格、文本框和图片。
+    """
+    def para(text, runs=3):
+        return {'type': 'para', 'para': {
+            'prop': {'alignment': 'left', 'outline_level': 1, 'def_run_prop': {'size': 18}},
+            'runs': [{'id': f'r{i}', 'text': f'{text}-{i}', 'prop': {'size': 12 + i, 'bold': i % 2 == 0}}
+                     for i in range(runs)]}}
+
+    def table(rows, cols, depth=0):
+        cells = []
+        for r in range(rows):
+            row = []
+            for c in range(cols):
+                blocks = [para(f'cell{r}{c}', 2)]
+                if depth == 0 and r == 0 and c == 0:
+                    blocks.append(table(2, 2, depth + 1))
+                row.append({'id': f'c{r}{c}', 'row_span': 1, 'col_span': 1, 'blocks': blocks})
+            cells.append({'cells': row})
+        return {'type': 'table', 'table': {'rows': cells}}
+
+    medias = [{'id': f'm{i}', 'mime_type': 'image/png', 'url': '', 'data': 'iVBORw0KGgo='} for i in range(slides)]
+    slide_list = []
+    for s in range(slides):
+        shape_tree = [para(f's{s}p{i}') for i in range(8)]
+        shape_tree += [table(4, 4) for _ in range(3)]
+        shape_tree.append({'type': 'textbox', 'textbox': {'blocks': [para(f's{s}t{i}') for i in range(3)]}})
+        shape_tree.append({'type': 'drawing', 'drawing': {'type': 'image', 'media_id': f'm{s}'}})
+        for i, block in enumerate(shape_tree):
+            block['bounding_box'] = {'x1': 0, 'y1': i * 10, 'x2': 100, 'y2': i * 10 + 10}
+        slide_list.append({'shape_tree': shape_tree})
+    return {'prop': {'slide_size': {'width': 960, 'height': 540}}, 'medias': medias,
+            'slide_containers': [{'category': 'slides', 'slides': slide_list}]}
+
+
+def walk_blocks(pres, blocks):
+    """
+    像渲染器一样访问块及其子对象的属性，返回访问到的文本长度之和。
+    """
+    total = 0
+    for block in blocks:
+        kind = block.type
+        if kind == 'para':
+            para = block.para
+            total += para.prop.outline_level + para.prop.def_run_prop.size
+            for run in para.runs:
+                prop = run.prop
+                total += len(run.text) + prop.size + prop.bold + prop.italic
+        elif kind == 'table':
+            for row in block.table.rows:
+                for cell in row.cells:
+                    total += cell.row_span + cell.col_span + walk_blocks(pres, cell.blocks)
+        elif kind == 'textbox':
+            total += walk_blocks(pres, block.textbox.blocks)
+        elif kind == 'drawing':
+            total += len(pres.media(block.drawing.media_id).id)
+    return total
+
+
+def walk(pres):
+    total = 0
+    for container in pres.slide_containers:
+        for slide in container.slides:
+            total += walk_blocks(pres, slide.shape_tree)
+    return total
+
+
+def traced_peak(func):
+    """
+    开启tracemalloc运行一次，返回内存峰值（字节）。
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def operations(presentation_cls, text, passes):
+    """
+    返回要测量的三种操作：解析（json.loads并构建根对象）、解析后遍历passes次、解析后用to_html渲染passes次。
+    操作不返回文档对象，否则之后的测量中仍有大量存活对象，垃圾回收的开销会变大。
+    """
+    def parse():
+        presentation_cls(json.loads(text))
+
+    def parse_walk():
+        pres = presentation_cls(json.loads(text))
+        return [walk(pres) for _ in range(passes)]
+
+    def parse_render():
+        pres = presentation_cls(json.loads(text))
+        return [pres.to_html('/media') for _ in range(passes)]
+
+    return {'parse': parse, 'walk': parse_walk, 'render': parse_render}
+
+
+def measure(models, text, passes, repeat):
+    """
+    测量每个模型每种操作的最短耗时（不开启tracemalloc）和tracemalloc内存峰值。
+    各模型交替运行，以减小机器负载变化对比较的影响。
+
+    参数：
+    models (dict): 名称到Presentation类的映射
+
+    返回：
+    dict: {名称: {操作: {'time': 秒, 'peak': 字节, 'value': 最后一次的结果}}}
+    """
+    ops = {name: operations(cls, text, passes) for name, cls in models.items()}
+    results = {name: {} for name in models}
+    for op in ('parse', 'walk', 'render'):
+        for _ in range(repeat):
+            for name in models:
+                gc.collect()
+                start = time.perf_counter()
+                value = ops[name][op]()
+                elapsed = time.perf_counter() - start
+                r = results[name].setdefault(op, {'time': elapsed})
+                r['time'] = min(r['time'], elapsed)
+                r['value'] = value
+        for name in models:
+            results[name][op]['peak'] = traced_peak(ops[name][op])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较旧的dict子类KDC模型与__slots__模型的耗时和内存峰值。")
+    parser.add_argument('--slides', type=int, default=200, help="合成文档的slide数")
+    parser.add_argument('--passes', type=int, default=1, help="解析后遍历或渲染的次数")
+    parser.add_argument('--repeat', type=int, default=5, help="计时的重复次数，取最短耗时")
+    parser.add_argument('--baseline', help="旧模型所在的git提交，默认为引入__slots__模型之前的提交")
+    args = parser.parse_args()
+
+    rev = args.baseline or find_baseline()
+    old_model = load_old_model(rev)
+    text = json.dumps(build_document(args.slides))
+    print(f"KDC JSON大小: {len(text) / 1024 / 1024:.1f} MB，{args.slides} 个slide，遍历 {args.passes} 次，旧模型: {rev}")
+
+    results = measure({'old': old_model['Presentation'], 'slots': kdc2xml.Presentation},
+                      text, args.passes, args.repeat)
+
+    old, new = results['old'], results['slots']
+    assert old['walk']['value'] == new['walk']['value'], "两种模型遍历得到的结果不同"
+    assert old['render']['value'] == new['render']['value'], "两种模型渲染得到的HTML不同"
+    labels = {'parse': '解析', 'walk': f'解析+遍历{args.passes}次', 'render': f'解析+渲染{args.passes}次'}
+    for key, label in labels.items():
+        print(f"{label}:")
+        for name in ('old', 'slots'):
+            r = results[name][key]
+            print(f"  {name:>5}: {r['time'] * 1000:8.1f} ms，tracemalloc峰值 {r['peak'] / 1024 / 1024:7.1f} MB")
+        print(f"  耗时 {new[key]['time'] / old[key]['time']:.2f}x，内存峰值 {new[key]['peak'] / old[key]['peak']:.2f}x"
+              f"（新模型/旧模型）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# benchmarks/bench_xml_backend.py
+# 功能：比较lxml和标准库ElementTree两种解析后端解析和打乱非固定格式XML的耗时。
+# 用法：python benchmarks/bench_xml_backend.py [--slides 2000] [--paragraphs 8] [--repeat 5]
+
+import os
+import sys
+import random
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import xml_backend
+from modules.xml_processor import XMLProcessor
+
+
+def build_xml(slides, paragraphs):
+    """
+    生成带缩进的XML，使shuffle_xml不能走固定格式的快速路径而必须解析。
+    """
+    lines = ['<slides>']
+    for slide_id in range(1, slides + 1):
+        lines.append(f'  <slide id="{slide_id}">')
+        for n in range(paragraphs):
+            lines.append(f'    <p>第{slide_id}页第{n}段 &amp; 一些正文内容，用于模拟真实的段落长度。</p>')
+        lines.append('  </slide>')
+    lines.append('</slides>')
+    return '\n'.join(lines)
+
+
+def best_of(func, repeat):
+    """
+    运行repeat次，返回最短的一次耗时（秒）。
+    """
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较XML解析后端的耗时。")
+    parser.add_argument('--slides', type=int, default=2000, help="slide数")
+    parser.add_argument('--paragraphs', type=int, default=8, help="每个slide的<p>数")
+    parser.add_argument('--repeat', type=int, default=5, help="重复次数，取最短耗时")
+    args = parser.parse_args()
+
+    xml_str = build_xml(args.slides, args.paragraphs)
+    print(f"XML大小: {len(xml_str.encode('utf-8')) / 1024:.0f} KB，"
+          f"{args.slides} 个slide，每个 {args.paragraphs} 个<p>")
+
+    backends = [name for name in xml_backend.XML_BACKENDS if name != 'lxml' or xml_backend.lxml_etree is not None]
+    results = {}
+    outputs = {}
+    for backend in backends:
+        xml_backend.set_backend(backend)
+        parse_time = best_of(lambda: xml_backend.parse_xml(xml_str), args.repeat)
+        shuffle_time = best_of(lambda: XMLProcessor.shuffle_xml(xml_str), args.repeat)
+        random.seed(0)
+        outputs[backend] = XMLProcessor.shuffle_xml(xml_str)
+        results[backend] = (parse_time, shuffle_time)
+        print(f"{backend:>6}: parse_xml {parse_time * 1000:8.1f} ms，shuffle_xml {shuffle_time * 1000:8.1f} ms")
+
+    if len(results) == 2:
+        (lxml_parse, lxml_shuffle), (std_parse, std_shuffle) = results['lxml'], results['stdlib']
+        print(f"加速比: parse_xml {std_parse / lxml_parse:.2f}x，shuffle_xml {std_shuffle / lxml_shuffle:.2f}x")
+        print(f"两种后端的打乱结果{'相同' if outputs['lxml'] == outputs['stdlib'] else '不同'}")
+    else:
+        print("未安装lxml，只测量了标准库后端。")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,31 @@
 # main.py
 
 import os
+import random
 import logging
+import concurrent.futures
 import yaml
-from modules.data_handler import DataHandler
+import pandas as pd
+from modules.data_handler import DataHandler, BLOB_THRESHOLD
 from modules.markdown_extractor import MarkdownExtractor
 from modules.markdown_to_xml import MarkdownToXMLConverter
+from modules.markdown_outline import MarkdownOutline
 from modules.xml_processor import XMLProcessor
+from modules.row_manifest import RowManifest
+from modules.result_cache import ResultCache, RESULT_CACHE_SIZE
+from modules.xml_backend import set_backend
+
+# 处理结果新增的列
+OUTPUT_COLUMNS = ['markdown_ppt', 'xml_ppt', 'xml_ppt-打乱']
+# 拆分多个code/execution块时新增的列
+OCCURRENCE_COLUMNS = ['source_id', 'block_start', 'block_end']
+# 额外的打乱变体列的列名前缀，第k个变体（k>=2）写入"xml_ppt-打乱-k"列，第1个变体写入"xml_ppt-打乱"列
+VARIANT_COLUMN_PREFIX = 'xml_ppt-打乱-'
+# 流水线版本，转换或打乱的输出格式变化时递增，使行哈希清单中的所有行失效
+PIPELINE_VERSION = 1
+
+# 工作进程中的结果缓存，由init_worker创建
+_worker_cache = None
 
 def setup_logging(log_file):
     """
@@ -62,6 +81,289 @@ def load_config(config_path='config/config.yaml'):
     logging.debug(f"从{config_path}加载配置文件: {config}")
     return config
 
+def output_columns(shuffle_variants=0):
+    """
+    获取处理结果新增的列。
+
+    参数:
+        shuffle_variants (int): 每行生成的打乱变体数，大于1时追加额外的变体列。
+
+    返回:
+        list of str: 结果列的列名。
+    """
+    return OUTPUT_COLUMNS + [f'{VARIANT_COLUMN_PREFIX}{k}' for k in range(2, shuffle_variants + 1)]
+
+def convert_markdown(markdown, converter):
+    """
+    只解析一次Markdown，得到转换后的XML和打乱所需的slide划分。
+
+    参数:
+        markdown (str): Markdown文本。
+        converter (MarkdownToXMLConverter): Markdown到XML转换器。
+
+    返回:
+        tuple: (XML字符串, 每个slide的(slide_id, 内容列表)组成的列表)。
+    """
+    outline = MarkdownOutline(markdown)
+    return converter.convert_outline(outline), outline.slides()
+
+def process_markdowns(indexes, ids, markdowns, converter, xml_processor, shuffle_variants=0, cache=None):
+    """
+    将已提取的Markdown转换为XML并打乱<p>顺序，按列返回结果。
+
+    参数:
+        indexes (list): 各行的索引（行在输入文件中的位置，0-based），用于日志。
+        ids (list): 各行id列的值，作为可复现打乱变体的种子。
+        markdowns (list of (str or None)): 各行提取的Markdown内容，None表示未找到。
+        converter (MarkdownToXMLConverter): Markdown到XML转换器。
+        xml_processor (XMLProcessor): XML处理器。
+        shuffle_variants (int): 每行生成的打乱变体数，见process_dataframe。
+        cache (ResultCache or None): 结果缓存，见process_dataframe。
+
+    返回:
+        dict: 结果列名到与markdowns一一对应的值列表的映射，未找到Markdown的行各列均为None。
+    """
+    results = {column: [None] * len(markdowns) for column in output_columns(shuffle_variants)}
+
+    for i, (index, row_id, markdown) in enumerate(zip(indexes, ids, markdowns)):
+        logging.info(f"处理第{index + 1}行数据。")
+        if markdown is None:
+            logging.warning(f"第{index + 1}行未找到目标Markdown内容。")
+            continue
+        results['markdown_ppt'][i] = markdown
+
+        # 转换Markdown为XML，转换和打乱共用同一次解析的结果
+        if cache is None:
+            xml, slides = convert_markdown(markdown, converter)
+        else:
+            xml, slides = cache.get_or_compute('convert', (markdown,),
+                                               lambda: convert_markdown(markdown, converter))
+        results['xml_ppt'][i] = xml
+
+        # 打乱XML中的<p>顺序
+        if shuffle_variants:
+            if cache is None:
+                variants = xml_processor.shuffle_slide_variants(slides, shuffle_variants, seed=row_id)
+            else:
+                variants = cache.get_or_compute(
+                    'shuffle', (markdown, shuffle_variants, row_id),
+                    lambda: xml_processor.shuffle_slide_variants(slides, shuffle_variants, seed=row_id))
+            results['xml_ppt-打乱'][i] = variants[0]
+            for k, variant in enumerate(variants[1:], start=2):
+                results[f'{VARIANT_COLUMN_PREFIX}{k}'][i] = variant
+        else:
+            results['xml_ppt-打乱'][i] = xml_processor.shuffle_slides(slides)
+
+    return results
+
+def init_worker(cache_args=None):
+    """
+    进程池工作进程的初始化函数：重新设置随机种子，避免fork出的进程产生相同的打乱结果，
+    并按需创建工作进程自己的结果缓存。
+
+    参数:
+        cache_args (tuple or None): 创建ResultCache的参数，为None时不使用缓存。
+    """
+    global _worker_cache
+    random.seed()
+    _worker_cache = ResultCache(*cache_args) if cache_args else None
+
+def process_chunk(indexes, ids, texts, extractor, converter, xml_processor, shuffle_variants=0):
+    """
+    在工作进程中处理一批行：提取Markdown、转换为XML并打乱<p>顺序。
+
+    参数:
+        indexes (list): 各行的索引。
+        ids (list): 各行id列的值。
+        texts (list): 各行text列的值。
+        extractor (MarkdownExtractor): Markdown提取器。
+        converter (MarkdownToXMLConverter): Markdown到XML转换器。
+        xml_processor (XMLProcessor): XML处理器。
+        shuffle_variants (int): 每行生成的打乱变体数。
+
+    返回:
+        tuple: (process_markdowns返回的结果, 本批的缓存命中次数, 本批的缓存未命中次数)。
+    """
+    cache = _worker_cache
+    hits, misses = (dict(cache.hits), dict(cache.misses)) if cache is not None else ({}, {})
+    markdowns = extractor.extract_many(texts)
+    results = process_markdowns(indexes, ids, markdowns, converter, xml_processor, shuffle_variants, cache)
+    if cache is None:
+        return results, {}, {}
+    return (results,
+            {kind: count - hits.get(kind, 0) for kind, count in cache.hits.items()},
+            {kind: count - misses.get(kind, 0) for kind, count in cache.misses.items()})
+
+def process_dataframe(df, extractor, converter, xml_processor, rows=None, shuffle_variants=0, cache=None,
+                      executor=None, workers=1):
+    """
+    处理一个DataFrame中的行：提取Markdown、转换为XML并打乱<p>顺序。
+
+    参数:
+        df (pandas.DataFrame): 包含'id'和'text'列的数据，索引为行在输入文件中的位置（0-based）。
+        extractor (MarkdownExtractor): Markdown提取器。
+        converter (MarkdownToXMLConverter): Markdown到XML转换器。
+        xml_processor (XMLProcessor): XML处理器。
+        rows (list or None): 需要处理的行的索引，为None时处理所有行。
+        shuffle_variants (int): 每行以id为种子生成的可复现打乱变体数，为0时使用全局随机状态只生成一个。
+        cache (ResultCache or None): 结果缓存，设置后内容相同的Markdown只转换一次，
+            可复现的打乱变体按(Markdown, 变体数, id)记忆；使用全局随机状态的打乱每次重新生成。
+            使用进程池时各工作进程使用自己的缓存，这里只汇总命中次数。
+        executor (concurrent.futures.ProcessPoolExecutor or None): 进程池，设置后将待处理的行分批交给工作进程，
+            工作进程应以init_worker初始化。
+        workers (int): 进程池的工作进程数，用于划分批次，使每个进程约分到4批。
+
+    返回:
+        pandas.DataFrame: 添加了新列的DataFrame。
+    """
+    columns = output_columns(shuffle_variants)
+    # 初始化新列
+    for column in columns:
+        if column not in df.columns:
+            df[column] = None
+    if rows is None:
+        rows = df.index
+    else:
+        # 清空需要重新处理的行中之前恢复的结果
+        df.loc[rows, columns] = None
+    if len(rows) == 0:
+        return df
+
+    indexes = list(rows)
+    ids = df.loc[rows, 'id'].tolist()
+    texts = df.loc[rows, 'text'].tolist()
+
+    if executor is None:
+        # 一次提取所有待处理行的Markdown内容，再逐行转换和打乱
+        markdowns = extractor.extract_many(texts)
+        results = process_markdowns(indexes, ids, markdowns, converter, xml_processor, shuffle_variants, cache)
+    else:
+        chunksize = max(1, -(-len(indexes) // (workers * 4)))
+        futures = [executor.submit(process_chunk, indexes[i:i + chunksize], ids[i:i + chunksize],
+                                   texts[i:i + chunksize], extractor, converter, xml_processor, shuffle_variants)
+                   for i in range(0, len(indexes), chunksize)]
+        logging.debug(f"使用进程池处理 {len(indexes)} 行，共 {len(futures)} 批。")
+        results = {column: [] for column in columns}
+        for future in futures:
+            chunk_results, hits, misses = future.result()
+            for column in columns:
+                results[column].extend(chunk_results[column])
+            if cache is not None:
+                cache.merge_stats(hits, misses)
+
+    # 按列写回结果
+    for column in columns:
+        df.loc[rows, column] = pd.Series(results[column], index=rows, dtype=object)
+
+    return df
+
+def split_occurrences(df, extractor, start=0):
+    """
+    将每行text中的每一对code/execution块拆分为独立的处理单元。
+
+    每个单元的id为"<原id>#<序号>"（序号从1开始），text为该对code/execution块所在的文本片段，
+    source_id、block_start和block_end记录原行的id以及片段在原text中的字符偏移。
+    没有找到任何块的行原样保留为一个单元。
+
+    参数:
+        df (pandas.DataFrame): 包含'id'和'text'列的数据。
+        extractor (MarkdownExtractor): Markdown提取器。
+        start (int): 第一个单元的索引，分块处理时用于保持索引连续。
+
+    返回:
+        pandas.DataFrame: 每个单元一行的DataFrame，索引从start开始。
+    """
+    columns = list(df.columns) + [column for column in OCCURRENCE_COLUMNS if column not in df.columns]
+    records = []
+    for row in df.to_dict('records'):
+        text = row['text']
+        blocks = list(extractor.iter_markdown(text)) if isinstance(text, str) else []
+        if not blocks:
+            records.append(dict(row, source_id=row['id'], block_start=None, block_end=None))
+            continue
+        for number, block in enumerate(blocks, 1):
+            records.append(dict(row, id=f"{row['id']}#{number}", text=text[block.start:block.end],
+                                source_id=row['id'], block_start=block.start, block_end=block.end))
+    return pd.DataFrame(records, columns=columns, index=pd.RangeIndex(start, start + len(records)))
+
+def load_previous_results(data_handler, columns=OUTPUT_COLUMNS):
+    """
+    读取上次的输出，并以id为索引，便于按id恢复结果。
+
+    参数:
+        data_handler (DataHandler): 数据处理对象。
+        columns (list of str): 需要恢复的结果列。
+
+    返回:
+        pandas.DataFrame or None: 以字符串形式的id为索引的结果列，没有上次输出时返回None。
+    """
+    # 只读取id和结果列，text和输入中的其他列不需要读入内存
+    previous_df = data_handler.read_output_excel(columns=['id'] + columns)
+    if previous_df is None:
+        return None
+    previous_df = previous_df.reindex(columns=['id'] + columns).astype(object)
+    previous_df.index = previous_df['id'].astype(str)
+    return previous_df[~previous_df.index.duplicated()][columns]
+
+def restore_unchanged_rows(df, previous_results, manifest, columns=OUTPUT_COLUMNS):
+    """
+    从上次的输出中恢复未变化行的结果，并找出需要重新处理的行。
+
+    参数:
+        df (pandas.DataFrame): 包含'id'和'text'列的数据。
+        previous_results (pandas.DataFrame or None): load_previous_results的返回值。
+        manifest (RowManifest): 行哈希清单。
+        columns (list of str): 需要恢复的结果列。
+
+    返回:
+        list: 需要处理的行的索引（哈希变化的行以及上次输出中不存在的行）。
+    """
+    for column in columns:
+        df[column] = None
+    if previous_results is None:
+        return list(df.index)
+
+    keys = df['id'].astype(str)
+    found = keys.isin(previous_results.index)
+    restored = previous_results.reindex(keys)
+    restored.index = df.index
+    df[columns] = restored
+
+    changed_rows = set(manifest.changed_rows(df))
+    return [idx for idx, is_found in zip(df.index, found) if idx in changed_rows or not is_found]
+
+def process_changed_rows(df, extractor, converter, xml_processor, previous_results, manifest,
+                         shuffle_variants=0, cache=None, executor=None, workers=1):
+    """
+    处理一个DataFrame；设置了行哈希清单时只处理发生变化的行，其余行沿用上次的结果。
+
+    参数:
+        df (pandas.DataFrame): 包含'id'和'text'列的数据。
+        extractor (MarkdownExtractor): Markdown提取器。
+        converter (MarkdownToXMLConverter): Markdown到XML转换器。
+        xml_processor (XMLProcessor): XML处理器。
+        previous_results (pandas.DataFrame or None): load_previous_results的返回值。
+        manifest (RowManifest or None): 行哈希清单。
+        shuffle_variants (int): 每行生成的打乱变体数，见process_dataframe。
+        cache (ResultCache or None): 结果缓存，见process_dataframe。
+        executor (concurrent.futures.ProcessPoolExecutor or None): 进程池，见process_dataframe。
+        workers (int): 进程池的工作进程数。
+
+    返回:
+        pandas.DataFrame: 添加了新列的DataFrame。
+    """
+    if manifest is None:
+        return process_dataframe(df, extractor, converter, xml_processor, shuffle_variants=shuffle_variants,
+                                 cache=cache, executor=executor, workers=workers)
+
+    rows = restore_unchanged_rows(df, previous_results, manifest, output_columns(shuffle_variants))
+    logging.info(f"共 {len(df)} 行，其中 {len(rows)} 行需要重新处理。")
+    df = process_dataframe(df, extractor, converter, xml_processor, rows, shuffle_variants, cache,
+                           executor, workers)
+    for row_id, text in zip(df['id'], df['text']):
+        manifest.update(row_id, text)
+    return df
+
 def main():
     """
     主函数，协调各个模块完成数据处理流程。
@@ -84,7 +386,15 @@ def main():
         output_file = os.path.join(config['output_file'])
 
         # 初始化模块
-        data_handler = DataHandler(input_file, output_file)
+        data_handler = DataHandler(
+            input_file, output_file,
+            shard_rows=config.get('shard_rows'),
+            shard_bytes=config.get('shard_bytes'),
+            shard_part=config.get('shard_part'),
+            shard_run=config.get('shard_run'),
+            blob_dir=config.get('blob_dir'),
+            blob_threshold=config.get('blob_threshold', BLOB_THRESHOLD)
+        )
         extractor = MarkdownExtractor(
             code_block_pattern=config['patterns']['code_block'],
             execution_block_pattern=config['patterns']['execution_block']
@@ -95,36 +405,84 @@ def main():
         # )
         converter = MarkdownToXMLConverter()
         xml_processor = XMLProcessor()
+        # 默认使用标准库解析XML，可以通过xml_backend指定为lxml
+        if config.get('xml_backend'):
+            set_backend(config['xml_backend'])
+
+        # 设置了shuffle_variants时，每行以id为种子生成多个可复现的打乱变体
+        shuffle_variants = config.get('shuffle_variants', 0)
+
+        # 设置了行哈希清单时，只处理text或流水线配置发生变化的行
+        manifest = None
+        previous_results = None
+        if config.get('manifest_file'):
+            manifest = RowManifest(config['manifest_file'], {
+                'patterns': config['patterns'],
+                'pipeline': PIPELINE_VERSION,
+                'shuffle_variants': shuffle_variants,
+            })
+            previous_results = load_previous_results(data_handler, output_columns(shuffle_variants))
+
+        # 设置了result_cache_size或result_cache_dir时，内容相同的Markdown只转换一次
+        cache = None
+        if config.get('result_cache_size') or config.get('result_cache_dir'):
+            cache = ResultCache(PIPELINE_VERSION, config.get('result_cache_size') or RESULT_CACHE_SIZE,
+                                config.get('result_cache_dir'))
+
+        # 设置了split_blocks时，每行text中的每一对code/execution块都作为独立的处理单元
+        split_blocks = config.get('split_blocks', False)
+
+        # 设置了workers（大于1）时，使用进程池并行提取、转换和打乱，各工作进程使用自己的结果缓存
+        workers = config.get('workers') or 1
+        executor = None
+        if workers > 1:
+            cache_args = (cache.version, cache.max_entries, cache.cache_dir) if cache is not None else None
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                                              initargs=(cache_args,))
+            logging.info(f"使用 {workers} 个工作进程处理数据。")
+
+        try:
+            chunk_size = config.get('chunk_size')
+            if chunk_size:
+                # 分块读取输入文件，每块处理完成后立即写入输出文件，内存占用取决于块大小而不是文件大小
+                writer = None
+                unit_count = 0
+                try:
+                    for chunk in data_handler.iter_rows(chunk_size=chunk_size):
+                        if split_blocks:
+                            chunk = split_occurrences(chunk, extractor, start=unit_count)
+                            unit_count += len(chunk)
+                        chunk = process_changed_rows(chunk, extractor, converter, xml_processor,
+                                                     previous_results, manifest, shuffle_variants, cache,
+                                                     executor, workers)
+                        if writer is None:
+                            writer = data_handler.open_writer(chunk.columns)
+                        writer.write_rows(chunk)
+                finally:
+                    if writer is not None:
+                        writer.close()
+                if writer is None:
+                    columns = (['id', 'text'] + (OCCURRENCE_COLUMNS if split_blocks else [])
+                               + output_columns(shuffle_variants))
+                    data_handler.write_excel(pd.DataFrame(columns=columns))
+            else:
+                # 读取输入文件
+                df = data_handler.read_excel()
+                if split_blocks:
+                    df = split_occurrences(df, extractor)
+                df = process_changed_rows(df, extractor, converter, xml_processor, previous_results, manifest,
+                                          shuffle_variants, cache, executor, workers)
+
+                # 保存结果到输出文件
+                data_handler.write_excel(df)
+        finally:
+            if executor is not None:
+                executor.shutdown()
 
-        # 读取Excel文件
-        df = data_handler.read_excel()
-
-        # 初始化新列
-        df['markdown_ppt'] = None
-        df['xml_ppt'] = None
-        df['xml_ppt-打乱'] = None
-
-        # 处理每一行
-        for index, row in df.iterrows():
-            text = row['text']
-            logging.info(f"处理第{index + 1}行数据。")
-            markdown = extractor.extract_markdown(text)
-            if markdown is None:
-                logging.warning(f"第{index + 1}行未找到目标Markdown内容。")
-                continue
-            df.at[index, 'markdown_ppt'] = markdown
-
-            # 转换Markdown为XML
-            converter.reset_id()
-            xml = converter.convert(markdown)
-            df.at[index, 'xml_ppt'] = xml
-
-            # 打乱XML中的<p>顺序
-            shuffled_xml = xml_processor.shuffle_xml(xml)
-            df.at[index, 'xml_ppt-打乱'] = shuffled_xml
-
-        # 保存结果到输出Excel文件
-        data_handler.write_excel(df)
+        if manifest is not None:
+            manifest.save()
+        if cache is not None:
+            cache.log_stats()
 
         logging.info("数据处理流程完成。")
 
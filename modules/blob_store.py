@@ -0,0 +1,101 @@
+# modules/blob_store.py
+# 功能：将超长的单元格内容（如整份PPT的XML）以内容寻址的方式压缩保存到独立目录，单元格中只保留引用。
+
+import os
+import gzip
+import hashlib
+import logging
+
+# 单元格中引用的前缀，完整格式为"blob:sha256:<十六进制哈希>"
+BLOB_REF_PREFIX = 'blob:sha256:'
+
+
+class BlobStore:
+    """
+    内容寻址的blob存储类。内容相同的blob只保存一份，文件按哈希的前两位分目录存放并使用gzip压缩。
+
+    属性:
+        blob_dir (str): blob存储目录的路径。
+    """
+
+    def __init__(self, blob_dir):
+        """
+        初始化BlobStore类。
+
+        参数:
+            blob_dir (str): blob存储目录的路径，不存在时在首次写入时创建。
+        """
+        self.blob_dir = blob_dir
+
+    @staticmethod
+    def is_ref(value):
+        """
+        判断值是否为blob引用。
+
+        参数:
+            value: 单元格的值。
+
+        返回:
+            bool: 是否为blob引用。
+        """
+        return isinstance(value, str) and value.startswith(BLOB_REF_PREFIX)
+
+    def put(self, text):
+        """
+        保存文本内容，返回写入单元格的引用。内容已存在时不会重复写入。
+
+        参数:
+            text (str): 需要保存的文本内容。
+
+        返回:
+            str: blob引用。
+        """
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再替换，保证并发写入同一内容时文件始终完整
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(gzip.compress(data))
+            os.replace(tmp_path, path)
+            logging.debug(f"保存blob: {digest}，原始大小 {len(data)} 字节")
+        return f"{BLOB_REF_PREFIX}{digest}"
+
+    def get(self, ref):
+        """
+        根据引用读取文本内容。
+
+        参数:
+            ref (str): blob引用。
+
+        返回:
+            str: 保存的文本内容。
+
+        异常:
+            ValueError: 如果ref不是blob引用。
+            FileNotFoundError: 如果blob文件不存在。
+        """
+        if not self.is_ref(ref):
+            raise ValueError(f"不是blob引用: {ref}")
+        with open(self._path(ref[len(BLOB_REF_PREFIX):]), 'rb') as f:
+            return gzip.decompress(f.read()).decode('utf-8')
+
+    def resolve(self, value):
+        """
+        如果值是blob引用则返回保存的内容，否则原样返回。
+
+        参数:
+            value: 单元格的值。
+
+        返回:
+            单元格的原始内容。
+        """
+        return self.get(value) if self.is_ref(value) else value
+
+    def _path(self, digest):
+        """
+        获取blob文件的路径。
+        """
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.gz")
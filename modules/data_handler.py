@@ -3,35 +3,209 @@
 
 import pandas as pd
 import os
+import io
+import glob
+import gzip
+import json
+import hashlib
+import time
 import logging
+import xlsxwriter
 from openpyxl import load_workbook
-from openpyxl.styles import Alignment
+from modules.blob_store import BlobStore
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 列式缓存中保存的列
+CACHE_COLUMNS = ['id', 'text']
+# 列式缓存每个行组的行数，按行范围读取时只解码覆盖该范围的行组
+CACHE_ROW_GROUP_SIZE = 1000
+# 超过该长度的单元格内容在启用blob存储时保存到blob目录（Excel单元格最多32767个字符）
+BLOB_THRESHOLD = 32767
+# Parquet输出每个行组的最大行数
+PARQUET_ROW_GROUP_SIZE = 10000
+# Parquet输出中使用字典编码的列，取值重复度高
+PARQUET_DICTIONARY_COLUMNS = ['theme_id']
+# Parquet输出中类型固定为数值的列（拆分code/execution块时记录的偏移），其余列都写为字符串
+PARQUET_COLUMN_TYPES = {'block_start': 'int64', 'block_end': 'int64'}
+# 输出中记录每行text哈希的列，用于判断text是否变化（Excel会截断超长的text单元格，不能直接比较text）
+TEXT_HASH_COLUMN = 'text_sha1'
+# 按行存储的JSON（NDJSON）文件扩展名，可选gzip或zstd压缩
+JSONL_EXTENSIONS = ('.jsonl', '.jsonl.gz', '.jsonl.zst')
+
+
+def is_jsonl(path):
+    """
+    根据扩展名判断文件是否为NDJSON格式。
+
+    参数:
+        path (str): 文件路径。
+
+    返回:
+        bool: 是否为.jsonl、.jsonl.gz或.jsonl.zst文件。
+    """
+    return path.lower().endswith(JSONL_EXTENSIONS)
+
+
+def open_text(path, mode='r'):
+    """
+    以UTF-8文本方式打开文件，根据扩展名透明地处理gzip和zstd压缩。
+
+    参数:
+        path (str): 文件路径。
+        mode (str): 'r'读取或'w'写入。
+
+    返回:
+        io.TextIOBase: 文本文件对象。
+
+    异常:
+        ImportError: 如果读写.zst文件但未安装zstandard。
+    """
+    lower_path = path.lower()
+    if lower_path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    if lower_path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("读写.zst文件需要安装zstandard。")
+        raw = open(path, mode + 'b')
+        if mode == 'w':
+            stream = zstandard.ZstdCompressor().stream_writer(raw)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def split_extension(path):
+    """
+    将文件路径拆分为主干和扩展名，NDJSON的压缩扩展名（如.jsonl.gz）作为一个整体。
+
+    参数:
+        path (str): 文件路径。
+
+    返回:
+        tuple: (主干, 扩展名)。
+    """
+    for extension in JSONL_EXTENSIONS[::-1]:
+        if path.lower().endswith(extension):
+            return path[:-len(extension)], path[-len(extension):]
+    return os.path.splitext(path)
+
+
+def is_parquet(path):
+    """
+    根据扩展名判断文件是否为Parquet格式。
+
+    参数:
+        path (str): 文件路径。
+
+    返回:
+        bool: 是否为.parquet文件。
+    """
+    return path.lower().endswith('.parquet')
+
+
+def open_row_writer(path, columns):
+    """
+    打开逐行写入器，根据文件扩展名选择格式。
+
+    参数:
+        path (str): 输出文件的路径。
+        columns (list of str): 输出的列名。
+
+    返回:
+        ExcelRowWriter, JsonlRowWriter or ParquetRowWriter: 提供write_rows(df)和close()方法的写入器。
+    """
+    if is_jsonl(path):
+        return JsonlRowWriter(path, columns)
+    if is_parquet(path):
+        return ParquetRowWriter(path, columns)
+    return ExcelRowWriter(path, columns)
+
+
+def text_hash(text):
+    """
+    计算一行text的哈希，写入输出的TEXT_HASH_COLUMN列。
+
+    参数:
+        text: 行的text列的值。
+
+    返回:
+        str or None: text的SHA-1哈希，text为缺失值时返回None。
+    """
+    if _is_missing(text):
+        return None
+    return hashlib.sha1(str(text).encode('utf-8')).hexdigest()
+
+
+def _is_missing(value):
+    """
+    判断单元格的值是否为缺失值（None或NaN）。
+    """
+    return value is None or (pd.api.types.is_scalar(value) and pd.isna(value))
 
 
 class DataHandler:
     """
-    数据处理类，用于读取和写入Excel文件。
+    数据处理类，用于读取和写入Excel文件。输入和输出文件的扩展名为.jsonl、.jsonl.gz或.jsonl.zst时，
+    改为按行流式读写NDJSON文件；扩展名为.parquet时读写Parquet文件。
 
     属性:
         input_file (str): 输入Excel文件的路径。
         output_file (str): 输出Excel文件的路径。
+        input_cache_file (str): 输入文件旁的列式缓存（Parquet）路径。
+        shard_rows (int or None): 每个输出分片的最大行数。
+        shard_bytes (int or None): 每个输出分片的最大字节数。
+        shard_part (str or None): 分片名称中的写入者标识。
+        shard_run (str or None): 本次运行的标识，同一次运行的所有写入者使用相同的值。
+        blob_store (BlobStore or None): 超长单元格内容的blob存储。
+        blob_threshold (int): 单元格内容超过该长度时保存为blob。
     """
 
-    def __init__(self, input_file, output_file):
+    def __init__(self, input_file, output_file, shard_rows=None, shard_bytes=None, shard_part=None,
+                 blob_dir=None, blob_threshold=BLOB_THRESHOLD, shard_run=None):
         """
         初始化DataHandler类。
 
         参数:
             input_file (str): 输入Excel文件的路径。
             output_file (str): 输出Excel文件的路径。
+            shard_rows (int or None): 每个输出分片的最大行数，为None时不按行数切分。
+            shard_bytes (int or None): 每个输出分片的最大字节数（按单元格文本长度估算），为None时不按大小切分。
+            shard_part (str or None): 分片名称中的写入者标识，多个进程并行写同一输出时各自使用不同的标识。
+            blob_dir (str or None): blob存储目录，设置后超长的单元格内容会压缩保存到该目录，单元格中只写入引用。
+            blob_threshold (int): 单元格内容超过该长度时保存为blob。
+            shard_run (str or None): 本次运行的标识，记录在写入者的清单中；读取时只合并最近一次运行的清单，
+                之前写入者更多的运行留下的清单会被忽略。
         """
         self.input_file = input_file
         self.output_file = output_file
+        self.shard_rows = shard_rows
+        self.shard_bytes = shard_bytes
+        self.shard_part = shard_part
+        self.shard_run = shard_run
+        self.blob_store = BlobStore(blob_dir) if blob_dir else None
+        self.blob_threshold = blob_threshold
+        self.input_cache_file = f"{input_file}.cache.parquet"
+        self._input_key = None
 
-    def read_excel(self):
+    def read_excel(self, build_cache=False):
         """
         读取输入的Excel文件，并验证必要的列是否存在。
 
+        参数:
+            build_cache (bool): 是否同时生成列式缓存，供之后按行范围读取使用。
+
         返回:
             pandas.DataFrame: 读取的DataFrame。
 
@@ -40,79 +214,1029 @@ class DataHandler:
             ValueError: 如果必要的列不存在。
         """
         logging.debug(f"尝试读取输入文件: {self.input_file}")
-        if not os.path.exists(self.input_file):
-            logging.error(f"输入文件 {self.input_file} 不存在。")
-            raise FileNotFoundError(f"输入文件 {self.input_file} 不存在。")
-        df = pd.read_excel(self.input_file)
-        if 'id' not in df.columns or 'text' not in df.columns:
-            logging.error("输入Excel文件必须包含'id'和'text'两列。")
-            raise ValueError("输入Excel文件必须包含'id'和'text'两列。")
+        self._check_input_file()
+        df = self._read_table(self.input_file)
+        self._check_columns(df.columns)
         logging.info("成功读取输入文件。")
+        if build_cache and self._open_input_cache() is None:
+            self._write_input_cache(df)
+        return df
+
+    def iter_rows(self, chunk_size=1000):
+        """
+        以只读模式逐块读取输入的Excel文件，每次产出最多chunk_size行，
+        避免一次性将整个工作簿加载到内存中。
+
+        参数:
+            chunk_size (int): 每个数据块的最大行数。
+
+        返回:
+            generator of pandas.DataFrame: 依次产出的数据块，索引为数据行在整个文件中的位置（0-based）。
+
+        异常:
+            FileNotFoundError: 如果输入文件不存在。
+            ValueError: 如果必要的列不存在，或chunk_size不是正整数。
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size必须是正整数。")
+        logging.debug(f"尝试分块读取输入文件: {self.input_file}，每块 {chunk_size} 行")
+        self._check_input_file()
+        if is_jsonl(self.input_file):
+            chunks = self._iter_jsonl_chunks(self.input_file, chunk_size)
+        elif is_parquet(self.input_file):
+            chunks = self._iter_parquet_chunks(self.input_file, chunk_size)
+        else:
+            chunks = self._iter_excel_chunks(chunk_size)
+
+        total_rows = 0
+        for chunk in chunks:
+            self._check_columns(chunk.columns)
+            total_rows += len(chunk)
+            yield chunk
+        logging.info(f"成功分块读取输入文件，共 {total_rows} 行。")
+
+    def _iter_excel_chunks(self, chunk_size):
+        """
+        使用openpyxl的只读模式逐块读取输入Excel文件。与read_excel（pandas.read_excel）一致，读取第一个工作表
+        而不是保存时的活动工作表，保留中间的空行、去掉末尾的空行，使行索引与不分块时相同。
+
+        参数:
+            chunk_size (int): 每个数据块的最大行数。
+
+        返回:
+            generator of pandas.DataFrame: 依次产出的数据块。
+        """
+        workbook = load_workbook(self.input_file, read_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, ())
+            columns = [f"Unnamed: {i}" if name is None else str(name) for i, name in enumerate(header)]
+            self._check_columns(columns)
+
+            start = 0
+            buffer = []
+            # 尚未确定是否位于末尾的连续空行数（只读模式下工作表的尺寸信息可能不准确，末尾可能有多余的空行）
+            blank_rows = 0
+            for values in rows:
+                if all(value is None for value in values):
+                    blank_rows += 1
+                    continue
+                for _ in range(blank_rows):
+                    buffer.append((None,) * len(columns))
+                    if len(buffer) >= chunk_size:
+                        yield pd.DataFrame(buffer, columns=columns, index=range(start, start + len(buffer)))
+                        start += len(buffer)
+                        buffer = []
+                blank_rows = 0
+                buffer.append(values[:len(columns)])
+                if len(buffer) >= chunk_size:
+                    yield pd.DataFrame(buffer, columns=columns, index=range(start, start + len(buffer)))
+                    start += len(buffer)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame(buffer, columns=columns, index=range(start, start + len(buffer)))
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _iter_parquet_chunks(path, chunk_size):
+        """
+        按批读取Parquet文件，每批最多chunk_size行。
+
+        参数:
+            path (str): Parquet文件的路径。
+            chunk_size (int): 每个数据块的最大行数。
+
+        返回:
+            generator of pandas.DataFrame: 依次产出的数据块，索引为行在整个文件中的位置（0-based）。
+        """
+        if pq is None:
+            raise ImportError("读写.parquet文件需要安装pyarrow。")
+        start = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            df = batch.to_pandas()
+            df.index = pd.RangeIndex(start, start + len(df))
+            start += len(df)
+            yield df
+
+    @classmethod
+    def _read_jsonl(cls, path, columns=None):
+        """
+        读取整个NDJSON文件。
+
+        参数:
+            path (str): NDJSON文件的路径。
+            columns (list of str or None): 只保留这些列，为None时保留所有列。
+
+        返回:
+            pandas.DataFrame: 读取的DataFrame。
+        """
+        chunks = list(cls._iter_jsonl_chunks(path, CACHE_ROW_GROUP_SIZE, columns))
+        if not chunks:
+            return pd.DataFrame(columns=CACHE_COLUMNS if columns is None else columns)
+        return pd.concat(chunks)
+
+    @staticmethod
+    def _iter_jsonl_chunks(path, chunk_size, columns=None):
+        """
+        逐行读取NDJSON文件，每chunk_size条记录组成一个数据块。
+
+        参数:
+            path (str): NDJSON文件的路径。
+            chunk_size (int): 每个数据块的最大行数。
+            columns (list of str or None): 只保留这些列，为None时保留所有列。
+
+        返回:
+            generator of pandas.DataFrame: 依次产出的数据块，索引为记录在整个文件中的位置（0-based）。
+        """
+        with open_text(path, 'r') as f:
+            start = 0
+            buffer = []
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if columns is not None:
+                    record = {column: record[column] for column in columns if column in record}
+                buffer.append(record)
+                if len(buffer) >= chunk_size:
+                    yield pd.DataFrame.from_records(buffer, index=range(start, start + len(buffer)))
+                    start += len(buffer)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame.from_records(buffer, index=range(start, start + len(buffer)))
+
+    def read_excel_range(self, start=0, stop=None):
+        """
+        读取输入文件中[start, stop)范围内的'id'和'text'列。
+
+        首次读取时解析整个Excel文件并在旁边生成列式缓存（Parquet），缓存以输入文件的大小、
+        修改时间和内容哈希为键；之后只从缓存中读取覆盖该范围的行组，不再解析Excel。
+        未安装pyarrow时退化为读取整个Excel文件后再切片。
+
+        参数:
+            start (int): 起始行（0-based，包含）。
+            stop (int or None): 结束行（0-based，不包含），为None时读取到末尾。
+
+        返回:
+            pandas.DataFrame: 只包含'id'和'text'列的DataFrame，索引为行在输入文件中的位置（0-based）。
+        """
+        parquet_file = self._open_input_cache()
+        if parquet_file is None:
+            df = self.read_excel(build_cache=True)[CACHE_COLUMNS]
+            return df.iloc[start:stop]
+
+        total_rows = parquet_file.metadata.num_rows
+        stop = total_rows if stop is None else min(stop, total_rows)
+        start = max(start, 0)
+        if start >= stop:
+            return pd.DataFrame(columns=CACHE_COLUMNS, index=pd.RangeIndex(start, start))
+
+        # 只读取与[start, stop)有交集的行组
+        row_groups = []
+        first_row = None
+        offset = 0
+        for i in range(parquet_file.num_row_groups):
+            num_rows = parquet_file.metadata.row_group(i).num_rows
+            if offset < stop and offset + num_rows > start:
+                row_groups.append(i)
+                if first_row is None:
+                    first_row = offset
+            offset += num_rows
+
+        df = parquet_file.read_row_groups(row_groups, columns=CACHE_COLUMNS).to_pandas()
+        df = df.iloc[start - first_row:stop - first_row]
+        df.index = pd.RangeIndex(start, stop)
+        logging.info(f"从列式缓存读取第 {start + 1} 至 {stop} 行。")
         return df
 
-    def read_output_excel(self):
+    def count_input_rows(self):
+        """
+        获取输入文件的数据行数，存在列式缓存时只读取缓存的元数据。
+
+        返回:
+            int: 输入文件的数据行数。
+        """
+        parquet_file = self._open_input_cache()
+        if parquet_file is None:
+            return len(self.read_excel_range())
+        return parquet_file.metadata.num_rows
+
+    def _input_cache_key(self):
+        """
+        根据输入文件的大小、修改时间和内容哈希计算列式缓存的键。
+
+        返回:
+            str: 缓存键。
+        """
+        stat = os.stat(self.input_file)
+        prefix = f"{stat.st_size}-{stat.st_mtime_ns}"
+        # 同一进程内文件未变化时复用已计算的哈希
+        if self._input_key is not None and self._input_key.startswith(prefix + '-'):
+            return self._input_key
+        sha1 = hashlib.sha1()
+        with open(self.input_file, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(block)
+        self._input_key = f"{prefix}-{sha1.hexdigest()}"
+        return self._input_key
+
+    def _open_input_cache(self):
+        """
+        打开与当前输入文件匹配的列式缓存。
+
+        返回:
+            pyarrow.parquet.ParquetFile or None: 缓存文件，如果缓存不可用或已过期则返回None。
+        """
+        if pq is None or not os.path.exists(self.input_cache_file):
+            return None
+        self._check_input_file()
+        try:
+            parquet_file = pq.ParquetFile(self.input_cache_file)
+            metadata = parquet_file.schema_arrow.metadata or {}
+        except Exception as e:
+            logging.warning(f"读取列式缓存 {self.input_cache_file} 时发生错误: {e}")
+            return None
+        if metadata.get(b'input_key', b'').decode('utf-8') != self._input_cache_key():
+            logging.info(f"输入文件已变化，列式缓存 {self.input_cache_file} 已过期。")
+            return None
+        return parquet_file
+
+    def _write_input_cache(self, df):
+        """
+        将输入文件的'id'和'text'列写入列式缓存。
+
+        数值列保持原类型，其他列（如Excel中整数和字符串混合的id列）按字符串写入，不由pyarrow推断类型。
+
+        参数:
+            df (pandas.DataFrame): 从输入文件读取的DataFrame。
+        """
+        if pa is None:
+            logging.debug("未安装pyarrow，跳过生成列式缓存。")
+            return
+        try:
+            arrays = []
+            for column in CACHE_COLUMNS:
+                series = df[column]
+                if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                    arrays.append(pa.array(series, from_pandas=True))
+                else:
+                    arrays.append(pa.array([None if _is_missing(value) else str(value) for value in series],
+                                           type=pa.string()))
+            table = pa.Table.from_arrays(arrays, names=CACHE_COLUMNS)
+            table = table.replace_schema_metadata({'input_key': self._input_cache_key()})
+            pq.write_table(table, self.input_cache_file, row_group_size=CACHE_ROW_GROUP_SIZE)
+            logging.info(f"成功生成列式缓存: {self.input_cache_file}")
+        except Exception as e:
+            logging.warning(f"生成列式缓存时发生错误: {e}")
+
+    def read_output_excel(self, columns=None):
         """
-        读取输出的Excel文件，如果不存在则返回None。
+        读取输出的Excel文件，如果不存在则返回None。输出被切分为分片时，读取清单中的所有分片。
+
+        参数:
+            columns (list of str or None): 只读取这些列（输出中不存在的列会被忽略），为None时读取所有列。
+                只需要部分列时指定，可以避免将text等大列读入内存。
 
         返回:
             pandas.DataFrame or None: 读取的DataFrame，或None如果文件不存在。
         """
         if not os.path.exists(self.output_file):
+            if self.read_manifest():
+                return self.read_output_shards(columns=columns)
             logging.info(f"输出文件 {self.output_file} 不存在，将创建新的文件。")
             return None
         logging.info(f"尝试读取输出文件: {self.output_file}")
         try:
-            df = pd.read_excel(self.output_file)
+            df = self._read_table(self.output_file, columns)
             logging.info("成功读取输出文件。")
             return df
         except Exception as e:
             logging.error(f"读取输出文件时发生错误: {e}")
             return None
 
+    def read_output_columns(self):
+        """
+        只读取输出文件（或第一个输出分片）的列名，不读取数据行。
+
+        返回:
+            list of str or None: 输出的列名，或None如果输出不存在或读取失败。
+        """
+        if os.path.exists(self.output_file):
+            path = self.output_file
+        else:
+            shards = self.read_manifest()
+            if not shards:
+                return None
+            path = os.path.join(os.path.dirname(self.output_file), shards[0]['file'])
+        try:
+            return self._read_columns(path)
+        except Exception as e:
+            logging.error(f"读取输出文件 {path} 的列名时发生错误: {e}")
+            return None
+
+    def merge_output(self, input_df, output_df, result_columns):
+        """
+        以id列为键，将上次的输出与当前输入对齐，而不是依赖行的位置。
+
+        对上次输出的id建立哈希索引后逐行查找，时间复杂度为O(n)。输入重新排序或追加行后，
+        已有的结果仍能对应到正确的行；text发生变化的行会清空结果列。
+
+        是否变化按上次输出中TEXT_HASH_COLUMN列记录的哈希判断，因为Excel会截断超过32767个字符的text单元格；
+        上次输出中没有该列（旧的输出）时才直接比较text。返回的输出中该列更新为当前text的哈希。
+
+        参数:
+            input_df (pandas.DataFrame): 当前输入的'id'和'text'列。
+            output_df (pandas.DataFrame): 上次的输出，记录了TEXT_HASH_COLUMN列时可以不包含text列。
+            result_columns (list of str): 结果列的列名。
+
+        返回:
+            tuple: (对齐后的输出DataFrame，索引与input_df相同；新增行的索引列表；text发生变化的行的索引列表)。
+        """
+        positions = {}
+        for position, row_id in enumerate(output_df['id']):
+            positions.setdefault(str(row_id), position)
+        matched = [positions.get(str(row_id), -1) for row_id in input_df['id']]
+
+        # 位置-1不存在于索引中，对应的新增行各列都为空
+        merged = output_df.reset_index(drop=True).reindex(matched)
+        merged.index = input_df.index
+        previous_texts = merged['text'].tolist() if 'text' in merged.columns else [None] * len(merged)
+        if TEXT_HASH_COLUMN in merged.columns:
+            previous_hashes = merged[TEXT_HASH_COLUMN].tolist()
+        else:
+            previous_hashes = [None] * len(merged)
+        current_hashes = [text_hash(text) for text in input_df['text']]
+        merged['id'] = input_df['id']
+        if 'text' in merged.columns:
+            merged['text'] = input_df['text']
+        else:
+            # 上次的输出未读取text列时，放回id之后的位置
+            merged.insert(merged.columns.get_loc('id') + 1, 'text', input_df['text'])
+        merged[TEXT_HASH_COLUMN] = current_hashes
+        for column in result_columns:
+            if column not in merged.columns:
+                merged[column] = None
+                logging.debug(f"添加缺失的列: {column}")
+
+        new_rows = []
+        changed_rows = []
+        for idx, position, previous_text, previous_hash, text, current_hash in zip(
+                input_df.index, matched, previous_texts, previous_hashes, input_df['text'], current_hashes):
+            if position < 0:
+                new_rows.append(idx)
+                continue
+            if not _is_missing(previous_hash):
+                if previous_hash != current_hash:
+                    changed_rows.append(idx)
+                continue
+            if self.blob_store is not None:
+                previous_text = self.blob_store.resolve(previous_text)
+            if not (previous_text == text or (_is_missing(previous_text) and _is_missing(text))):
+                changed_rows.append(idx)
+        if changed_rows:
+            merged[result_columns] = merged[result_columns].astype(object)
+            merged.loc[changed_rows, result_columns] = None
+
+        logging.info(f"按id合并上次的输出：新增 {len(new_rows)} 行，内容变化 {len(changed_rows)} 行。")
+        return merged, new_rows, changed_rows
+
+    def read_manifest(self):
+        """
+        读取输出分片的清单。单个写入者的输出只有一个清单；多个写入者的清单按记录的运行标识（shard_run）分组，
+        只合并最近更新的清单所属的那次运行，忽略之前的运行留下的清单。
+
+        返回:
+            list of dict: 分片信息列表，每项包含file、rows、first_id、last_id、bytes和sha256。
+        """
+        stem, _ = split_extension(self.output_file)
+        manifests = []
+        manifest_files = glob.glob(f"{glob.escape(stem)}.manifest.json") + \
+            sorted(glob.glob(f"{glob.escape(stem)}-*.manifest.json"))
+        for manifest_file in manifest_files:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                manifests.append(json.load(f))
+        if manifests:
+            latest = max(manifests, key=lambda manifest: manifest.get('updated_at', 0))
+            manifests = [manifest for manifest in manifests if manifest.get('run') == latest.get('run')]
+        return [shard for manifest in manifests for shard in manifest['shards']]
+
+    def read_output_shards(self, shards=None, columns=None):
+        """
+        读取输出分片并合并为一个DataFrame。
+
+        参数:
+            shards (list of dict or None): 需要读取的分片（read_manifest返回的条目），为None时读取全部分片。
+            columns (list of str or None): 只读取这些列，为None时读取所有列。
+
+        返回:
+            pandas.DataFrame or None: 合并后的DataFrame，没有分片时返回None。
+        """
+        if shards is None:
+            shards = self.read_manifest()
+        if not shards:
+            return None
+        shard_dir = os.path.dirname(self.output_file)
+        frames = []
+        for shard in shards:
+            logging.debug(f"读取输出分片: {shard['file']}")
+            frames.append(self._read_table(os.path.join(shard_dir, shard['file']), columns))
+        logging.info(f"成功读取 {len(frames)} 个输出分片。")
+        return pd.concat(frames, ignore_index=True)
+
+    @classmethod
+    def _read_table(cls, path, columns=None):
+        """
+        根据扩展名读取整个Excel、NDJSON或Parquet文件。
+
+        参数:
+            path (str): 文件路径。
+            columns (list of str or None): 只读取这些列（文件中不存在的列会被忽略），为None时读取所有列。
+
+        返回:
+            pandas.DataFrame: 读取的DataFrame。
+        """
+        if is_jsonl(path):
+            return cls._read_jsonl(path, columns).reset_index(drop=True)
+        if is_parquet(path):
+            if pq is None:
+                raise ImportError("读写.parquet文件需要安装pyarrow。")
+            if columns is not None:
+                names = pq.read_schema(path).names
+                columns = [column for column in columns if column in names]
+            return pq.read_table(path, columns=columns).to_pandas()
+        if columns is not None:
+            return cls._read_excel_columns(path, columns)
+        return pd.read_excel(path)
+
+    @staticmethod
+    def _read_columns(path):
+        """
+        读取Excel、NDJSON或Parquet文件的列名：Excel读取第一个工作表的表头，NDJSON读取第一条记录的键。
+
+        参数:
+            path (str): 文件路径。
+
+        返回:
+            list of str: 列名。
+        """
+        if is_jsonl(path):
+            with open_text(path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        return list(json.loads(line))
+            return []
+        if is_parquet(path):
+            if pq is None:
+                raise ImportError("读写.parquet文件需要安装pyarrow。")
+            return pq.read_schema(path).names
+        workbook = load_workbook(path, read_only=True)
+        try:
+            header = next(workbook.worksheets[0].iter_rows(values_only=True), ())
+        finally:
+            workbook.close()
+        return [str(name) for name in header if name is not None]
+
+    @staticmethod
+    def _read_excel_columns(path, columns):
+        """
+        使用openpyxl的只读模式逐行读取Excel文件第一个工作表中的指定列，其他列的单元格不会保留在内存中。
+
+        参数:
+            path (str): Excel文件的路径。
+            columns (list of str): 需要读取的列，文件中不存在的列会被忽略。
+
+        返回:
+            pandas.DataFrame: 读取的DataFrame，跳过所有指定列都为空的行。
+        """
+        workbook = load_workbook(path, read_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = [None if name is None else str(name) for name in next(rows, ())]
+            positions = {name: i for i, name in reversed(list(enumerate(header))) if name is not None}
+            selected = [(column, positions[column]) for column in columns if column in positions]
+            records = []
+            for values in rows:
+                record = tuple(values[i] if i < len(values) else None for _, i in selected)
+                if any(value is not None for value in record):
+                    records.append(record)
+        finally:
+            workbook.close()
+        return pd.DataFrame(records, columns=[column for column, _ in selected])
+
+    def _check_input_file(self):
+        """
+        检查输入文件是否存在。
+
+        异常:
+            FileNotFoundError: 如果输入文件不存在。
+        """
+        if not os.path.exists(self.input_file):
+            logging.error(f"输入文件 {self.input_file} 不存在。")
+            raise FileNotFoundError(f"输入文件 {self.input_file} 不存在。")
+
+    @staticmethod
+    def _check_columns(columns):
+        """
+        检查必要的'id'和'text'列是否存在。
+
+        参数:
+            columns (iterable of str): 输入文件的列名。
+
+        异常:
+            ValueError: 如果必要的列不存在。
+        """
+        if 'id' not in columns or 'text' not in columns:
+            logging.error("输入Excel文件必须包含'id'和'text'两列。")
+            raise ValueError("输入Excel文件必须包含'id'和'text'两列。")
+
     def write_excel(self, df):
         """
-        将处理后的DataFrame写入输出Excel文件。
+        将处理后的DataFrame一次性写入带格式的输出Excel文件。
 
         参数:
             df (pandas.DataFrame): 处理后的DataFrame。
         """
         logging.debug(f"尝试写入输出文件: {self.output_file}")
-        df.to_excel(self.output_file, index=False, sheet_name='Sheet1')
+        writer = self.open_writer(df.columns)
+        try:
+            writer.write_rows(df)
+        finally:
+            writer.close()
         logging.info(f"成功写入输出文件。")
 
-        try:
-            # 首先需要创建一个带格式的workbook
-            writer = pd.ExcelWriter(self.output_file, engine='xlsxwriter')
-            df.to_excel(writer, index=False, sheet_name='Sheet1')
-            workbook = writer.book
-
-            # 创建一个格式对象
-            text_format = workbook.add_format({
-                'text_wrap': True,  # 自动换行
-                'align': 'left',  # 水平居左
-                'valign': 'top',  # 垂直居上
-            })
-            link_format = workbook.add_format({
-                'text_wrap': True,  # 自动换行
-                'align': 'left',  # 水平居左
-                'valign': 'vcenter',  # 垂直居上
-                'font_color': 'blue',  # 字体颜色为蓝色
-                'underline': 1,  # 下划线
-            })
-
-            # 应用格式
-            worksheet = writer.sheets['Sheet1']  # 假设工作表名为'Sheet1'
-
-            # 设置列宽和格式
-            worksheet.set_column(1, 2, 80, text_format)  # 参数：起始列，结束列，宽度，格式
-            worksheet.set_column(3, 5, 40, link_format)
-            worksheet.set_column(5, 5, 80, text_format)
-
-            # 设置行高
-            for row in range(1, worksheet.dim_rowmax):  # 从第2行开始
-                worksheet.set_row(row, 100)  # 参数：行号，高度
-
-            writer._save()
-            logging.info("成功调整Excel格式。")
-        except Exception as e:
-            logging.error(f"调整Excel格式时发生错误: {e}")
+    def open_writer(self, columns):
+        """
+        打开输出文件的逐行写入器，根据输出文件的扩展名选择格式；
+        设置了shard_rows或shard_bytes时，输出按分片轮转写入并生成清单。
+
+        参数:
+            columns (list of str): 输出的列名。
+
+        返回:
+            提供write_rows(df)和close()方法的写入器。
+        """
+        if self.shard_rows or self.shard_bytes:
+            writer = ShardedRowWriter(self.output_file, columns, self.shard_rows, self.shard_bytes, self.shard_part,
+                                      self.shard_run)
+        else:
+            writer = open_row_writer(self.output_file, columns)
+        if self.blob_store is not None:
+            writer = BlobRowWriter(writer, self.blob_store, self.blob_threshold)
+        return writer
+
+    def resolve_blobs(self, df):
+        """
+        将DataFrame中的blob引用替换为保存的原始内容。
+
+        参数:
+            df (pandas.DataFrame): 从输出文件读取的DataFrame。
+
+        返回:
+            pandas.DataFrame: 替换后的DataFrame（未启用blob存储时原样返回）。
+        """
+        if self.blob_store is None:
+            return df
+        df = df.copy()
+        for column in df.columns:
+            if df[column].dtype == object or pd.api.types.is_string_dtype(df[column]):
+                df[column] = df[column].map(self.blob_store.resolve)
+        return df
+
+
+class ExcelRowWriter:
+    """
+    带格式的Excel逐行写入器，使用xlsxwriter的constant_memory模式，
+    每行写出后即刷新到磁盘，内存占用与总行数无关。
+
+    属性:
+        path (str): 输出Excel文件的路径。
+        columns (list of str): 输出的列名。
+        row_count (int): 已写入的数据行数。
+    """
+
+    # 数据行的默认行高
+    ROW_HEIGHT = 100
+
+    def __init__(self, path, columns):
+        """
+        初始化ExcelRowWriter类，创建工作表、设置列格式并写入表头。
+
+        参数:
+            path (str): 输出Excel文件的路径。
+            columns (list of str): 输出的列名。
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.row_count = 0
+
+        self.workbook = xlsxwriter.Workbook(path, {
+            'constant_memory': True,
+            'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+        })
+        self.worksheet = self.workbook.add_worksheet('Sheet1')
+
+        # 创建格式对象
+        text_format = self.workbook.add_format({
+            'text_wrap': True,  # 自动换行
+            'align': 'left',  # 水平居左
+            'valign': 'top',  # 垂直居上
+        })
+        link_format = self.workbook.add_format({
+            'text_wrap': True,  # 自动换行
+            'align': 'left',  # 水平居左
+            'valign': 'vcenter',  # 垂直居中
+            'font_color': 'blue',  # 字体颜色为蓝色
+            'underline': 1,  # 下划线
+        })
+        header_format = self.workbook.add_format({
+            'bold': True,
+            'border': 1,
+            'align': 'center',
+            'valign': 'top',
+        })
+
+        # 设置列宽和格式（constant_memory模式下必须在写入数据前设置）
+        self.worksheet.set_column(1, 2, 80, text_format)  # 参数：起始列，结束列，宽度，格式
+        self.worksheet.set_column(3, 4, 40, link_format)
+        self.worksheet.set_column(5, 5, 80, text_format)
+
+        # 设置默认行高，表头保持普通行高
+        self.worksheet.set_default_row(self.ROW_HEIGHT)
+        self.worksheet.set_row(0, 15)
+        for col, name in enumerate(self.columns):
+            self.worksheet.write_string(0, col, str(name), header_format)
+
+    def write_rows(self, df):
+        """
+        按顺序追加写入DataFrame中的所有行，缺失值写为空单元格。
+
+        参数:
+            df (pandas.DataFrame): 需要写入的数据，列顺序需与表头一致。
+        """
+        worksheet = self.worksheet
+        for values in df.reindex(columns=self.columns).itertuples(index=False, name=None):
+            self.row_count += 1
+            for col, value in enumerate(values):
+                if _is_missing(value):
+                    continue
+                worksheet.write(self.row_count, col, value)
+
+    def close(self):
+        """
+        完成写入并关闭工作簿。
+        """
+        self.workbook.close()
+
+
+class JsonlRowWriter:
+    """
+    NDJSON逐行写入器，每行数据写为一个JSON对象，每批写入后立即刷新到磁盘。
+
+    属性:
+        path (str): 输出文件的路径，.gz或.zst扩展名时自动压缩。
+        columns (list of str): 输出的列名。
+        row_count (int): 已写入的数据行数。
+    """
+
+    def __init__(self, path, columns):
+        """
+        初始化JsonlRowWriter类并打开输出文件。
+
+        参数:
+            path (str): 输出文件的路径。
+            columns (list of str): 输出的列名。
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.row_count = 0
+        self._file = open_text(path, 'w')
+
+    def write_rows(self, df):
+        """
+        按顺序追加写入DataFrame中的所有行，缺失值写为null。
+
+        参数:
+            df (pandas.DataFrame): 需要写入的数据。
+        """
+        # 先按表头的列顺序写出，再追加数据中额外的列
+        columns = self.columns + [column for column in df.columns if column not in self.columns]
+        for values in df.reindex(columns=columns).itertuples(index=False, name=None):
+            record = {column: None if _is_missing(value) else value for column, value in zip(columns, values)}
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str))
+            self._file.write('\n')
+            self.row_count += 1
+        self._file.flush()
+
+    def close(self):
+        """
+        完成写入并关闭输出文件。
+        """
+        self._file.close()
+
+
+class ParquetRowWriter:
+    """
+    Parquet逐批写入器，使用zstd压缩，对theme_id等重复度高的列使用字典编码。
+    重复的XML标签和模板文本经zstd压缩后体积远小于xlsx，下游可以直接内存映射并只读取需要的列。
+
+    每列的类型在创建写入器时确定，不根据第一批数据推断，避免之后的批次（如NDJSON输入中整数id之后出现字符串id）
+    与已写入的类型不符而中途失败：column_types中指定的列使用指定的类型，其余列（包括id）统一写为字符串。
+
+    属性:
+        path (str): 输出文件的路径。
+        columns (list of str): 输出的列名。
+        row_count (int): 已写入的数据行数。
+    """
+
+    def __init__(self, path, columns, column_types=None):
+        """
+        初始化ParquetRowWriter类。文件在第一次写入时创建。
+
+        参数:
+            path (str): 输出文件的路径。
+            columns (list of str): 输出的列名。
+            column_types (dict or None): 列名到pyarrow类型别名（如'int64'、'float64'）的映射，
+                为None时使用PARQUET_COLUMN_TYPES。
+        """
+        if pa is None:
+            raise ImportError("读写.parquet文件需要安装pyarrow。")
+        self.path = path
+        self.columns = [str(column) for column in columns]
+        self.row_count = 0
+        if column_types is None:
+            column_types = PARQUET_COLUMN_TYPES
+        self._schema = pa.schema([
+            pa.field(column, pa.type_for_alias(column_types[column]) if column in column_types else pa.string())
+            for column in self.columns
+        ])
+        self._writer = None
+
+    def write_rows(self, df):
+        """
+        按顺序追加写入DataFrame中的所有行，缺失值写为null。
+
+        参数:
+            df (pandas.DataFrame): 需要写入的数据。
+        """
+        df = df.reindex(columns=self.columns)
+        if self._writer is None:
+            self._open()
+        arrays = []
+        for field in self._schema:
+            values = df[field.name]
+            if pa.types.is_string(field.type):
+                values = values.map(lambda value: None if _is_missing(value) else str(value))
+            arrays.append(pa.array(values, type=field.type, from_pandas=True))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema),
+                                 row_group_size=PARQUET_ROW_GROUP_SIZE)
+        self.row_count += len(df)
+
+    def close(self):
+        """
+        完成写入并关闭输出文件。没有写入任何行时也会生成只有列信息的文件。
+        """
+        if self._writer is None:
+            self._open()
+        self._writer.close()
+
+    def _open(self):
+        """
+        创建输出文件。
+        """
+        dictionary_columns = [column for column in PARQUET_DICTIONARY_COLUMNS if column in self.columns]
+        self._writer = pq.ParquetWriter(self.path, self._schema, compression='zstd',
+                                        use_dictionary=dictionary_columns)
+
+
+class ShardedRowWriter:
+    """
+    分片写入器，每写满shard_rows行或shard_bytes字节就切换到下一个编号的分片，
+    并在每个分片完成后更新JSON清单，记录分片文件、行数、id范围和校验和。
+
+    分片命名为"<主干>[-<写入者标识>]-<编号><扩展名>"，清单命名为"<主干>[-<写入者标识>].manifest.json"，
+    多个进程使用不同的写入者标识即可并行写出同一份输出，此时应为同一次运行的所有写入者设置相同的运行标识，
+    读取时据此忽略之前的运行留下的清单。
+
+    写入第一个分片前删除同一写入者之前的清单和分片；没有写入者标识时输出只属于这一个写入者，
+    同时删除多写入者输出的清单和分片，有写入者标识时删除单写入者输出的清单和分片。
+
+    属性:
+        path (str): 输出文件的路径，分片与清单的名称由它派生。
+        columns (list of str): 输出的列名。
+        row_count (int): 已写入的数据行数。
+        manifest_file (str): 清单文件的路径。
+    """
+
+    def __init__(self, path, columns, shard_rows=None, shard_bytes=None, part=None, run=None):
+        """
+        初始化ShardedRowWriter类。
+
+        参数:
+            path (str): 输出文件的路径。
+            columns (list of str): 输出的列名。
+            shard_rows (int or None): 每个分片的最大行数。
+            shard_bytes (int or None): 每个分片的最大字节数（按单元格文本长度估算）。
+            part (str or None): 写入者标识。
+            run (str or None): 运行标识，记录在清单中。
+        """
+        if not shard_rows and not shard_bytes:
+            raise ValueError("shard_rows和shard_bytes至少需要设置一个。")
+        if part is not None and run is None:
+            logging.warning("设置了写入者标识但没有设置运行标识，之前的运行留下的其他写入者的分片也会被读取。")
+        self.path = path
+        self.columns = list(columns)
+        self.shard_rows = shard_rows
+        self.shard_bytes = shard_bytes
+        self.row_count = 0
+
+        self.run = run
+        stem, self._extension = split_extension(path)
+        self._stem = stem
+        self._part = part
+        self._prefix = f"{stem}-{part}" if part is not None else stem
+        self.manifest_file = f"{self._prefix}.manifest.json"
+        self._shards = []
+        self._writer = None
+        self._shard_path = None
+        self._shard_rows = 0
+        self._shard_bytes = 0
+        self._first_id = None
+        self._last_id = None
+
+    def write_rows(self, df):
+        """
+        按顺序追加写入DataFrame中的所有行，在达到分片上限时切换分片。
+
+        参数:
+            df (pandas.DataFrame): 需要写入的数据。
+        """
+        ids = df['id'].tolist() if 'id' in df.columns else [None] * len(df)
+        row_sizes = [
+            sum(len(str(value)) for value in values if not _is_missing(value))
+            for values in df.itertuples(index=False, name=None)
+        ] if self.shard_bytes else None
+
+        start = 0
+        while start < len(df):
+            if self._writer is None:
+                self._open_shard()
+            stop = start
+            while stop < len(df) and not self._is_full():
+                self._shard_rows += 1
+                if row_sizes is not None:
+                    self._shard_bytes += row_sizes[stop]
+                stop += 1
+            self._writer.write_rows(df.iloc[start:stop])
+            if self._first_id is None:
+                self._first_id = ids[start]
+            self._last_id = ids[stop - 1]
+            self.row_count += stop - start
+            start = stop
+            if self._is_full():
+                self._close_shard()
+
+    def close(self):
+        """
+        关闭当前分片并写出最终的清单。
+        """
+        if self._writer is not None:
+            self._close_shard()
+        elif not self._shards:
+            # 没有任何数据时也写出一个只有表头的分片，保证输出可以被读取
+            self._open_shard()
+            self._close_shard()
+
+    def _is_full(self):
+        """
+        判断当前分片是否已达到行数或字节数上限。
+        """
+        if self.shard_rows and self._shard_rows >= self.shard_rows:
+            return True
+        return bool(self.shard_bytes) and self._shard_bytes >= self.shard_bytes
+
+    def _open_shard(self):
+        """
+        打开下一个编号的分片。
+        """
+        if not self._shards:
+            self._remove_previous_output()
+        self._shard_path = f"{self._prefix}-{len(self._shards):05d}{self._extension}"
+        self._writer = open_row_writer(self._shard_path, self.columns)
+        self._shard_rows = 0
+        self._shard_bytes = 0
+        self._first_id = None
+        self._last_id = None
+        logging.debug(f"打开输出分片: {self._shard_path}")
+
+    def _remove_previous_output(self):
+        """
+        删除之前的运行留下的、会与本次输出混在一起读取的清单及其列出的分片。
+        """
+        if self._part is None:
+            manifest_files = [self.manifest_file] + glob.glob(f"{glob.escape(self._stem)}-*.manifest.json")
+        else:
+            manifest_files = [self.manifest_file, f"{self._stem}.manifest.json"]
+        shard_dir = os.path.dirname(self.path)
+        for manifest_file in manifest_files:
+            if not os.path.exists(manifest_file):
+                continue
+            try:
+                with open(manifest_file, 'r', encoding='utf-8') as f:
+                    shard_files = [shard['file'] for shard in json.load(f)['shards']]
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"读取之前的清单 {manifest_file} 时发生错误: {e}")
+                shard_files = []
+            for shard_file in shard_files:
+                shard_path = os.path.join(shard_dir, shard_file)
+                if os.path.exists(shard_path):
+                    os.remove(shard_path)
+            os.remove(manifest_file)
+            logging.info(f"删除之前的输出清单 {manifest_file} 及其 {len(shard_files)} 个分片。")
+
+    def _close_shard(self):
+        """
+        关闭当前分片，计算校验和并更新清单。
+        """
+        self._writer.close()
+        self._writer = None
+
+        sha256 = hashlib.sha256()
+        with open(self._shard_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha256.update(block)
+        self._shards.append({
+            'file': os.path.basename(self._shard_path),
+            'rows': self._shard_rows,
+            'first_id': self._first_id,
+            'last_id': self._last_id,
+            'bytes': os.path.getsize(self._shard_path),
+            'sha256': sha256.hexdigest(),
+        })
+
+        # 先写临时文件再替换，避免读取到写了一半的清单
+        manifest = {'columns': self.columns, 'run': self.run, 'updated_at': time.time(), 'shards': self._shards}
+        tmp_file = f"{self.manifest_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp_file, self.manifest_file)
+        logging.info(f"完成输出分片: {self._shard_path}，共 {self._shard_rows} 行。")
+
+
+class BlobRowWriter:
+    """
+    在写入前将超长的字符串单元格保存为blob并替换为引用的写入器包装。
+
+    属性:
+        writer: 被包装的写入器。
+        blob_store (BlobStore): blob存储。
+        threshold (int): 单元格内容超过该长度时保存为blob。
+        blob_count (int): 替换为引用的单元格数量。
+    """
+
+    def __init__(self, writer, blob_store, threshold=BLOB_THRESHOLD):
+        """
+        初始化BlobRowWriter类。
+
+        参数:
+            writer: 被包装的写入器。
+            blob_store (BlobStore): blob存储。
+            threshold (int): 单元格内容超过该长度时保存为blob。
+        """
+        self.writer = writer
+        self.blob_store = blob_store
+        self.threshold = threshold
+        self.blob_count = 0
+
+    @property
+    def row_count(self):
+        return self.writer.row_count
+
+    def write_rows(self, df):
+        """
+        替换超长单元格后按顺序追加写入DataFrame中的所有行。
+
+        参数:
+            df (pandas.DataFrame): 需要写入的数据。
+        """
+        copied = False
+        for column in df.columns:
+            values = df[column]
+            oversized = values.map(lambda value: isinstance(value, str) and len(value) > self.threshold)
+            if not oversized.any():
+                continue
+            if not copied:
+                df = df.copy()
+                copied = True
+            df[column] = df[column].astype(object)
+            df.loc[oversized, column] = values[oversized].map(self.blob_store.put)
+            self.blob_count += int(oversized.sum())
+        self.writer.write_rows(df)
+
+    def close(self):
+        """
+        关闭被包装的写入器。
+        """
+        self.writer.close()
+        if self.blob_count:
+            logging.info(f"共 {self.blob_count} 个超长单元格保存到blob目录: {self.blob_store.blob_dir}")
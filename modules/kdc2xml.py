@@ -2,15 +2,20 @@ import json
 import logging
 import tempfile
 from typing import Literal, List, Callable
+from collections.abc import Mapping
 from io import IOBase, StringIO
 from xml.dom import minidom
 
 import requests
 import base64
 import os
+import shutil
 import hashlib
+import weakref
 
 _cache_path = "../clean_file/cache"
+# 下载媒体文件时每次写入的字节数
+_media_chunk_size = 1 << 16
 
 
 def base64decode(encode: str) -> bytes:
@@ -23,7 +28,7 @@ def base64decode(encode: str) -> bytes:
 BlockType = Literal['para', 'table', 'component', 'textbox', 'drawing']
 
 
-def _to_class_list(d: dict, key: str, cls) -> list:
+def _to_class_list(d: Mapping, key: str, cls) -> list:
     if key not in d:
         return []
     v = d[key]
@@ -32,230 +37,331 @@ def _to_class_list(d: dict, key: str, cls) -> list:
     return [cls(x) for x in v]
 
 
-class Node(dict):
+class KdcObject(Mapping):
+    """
+    KDC对象的基类。原始的JSON字典保存在_data中（不复制），标量字段由属性直接读取，子对象在每次访问时用_data中的
+    子字典包装。包装对象只有一个槽，创建的开销很小；不缓存子对象是有意为之：渲染通常只遍历一次文档，缓存的包装对象
+    会一直存活并增加循环垃圾回收的开销，实测比每次重新包装更慢（见benchmarks/bench_kdc_model.py）。
+    仍可以通过obj['key']、obj.get('key')和'key' in obj访问原始字段（如bounding_box）。
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, data: Mapping = None):
+        self._data = {} if data is None else data
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self._data!r})'
+
+
+class Node(KdcObject):
+    __slots__ = ()
+
     @property
     def outline_level(self) -> int:
-        return self.get('outline_level', 10)
+        return self._data.get('outline_level', 10)
 
     @property
     def blocks(self) -> List['Block']:
-        return _to_class_list(self, 'blocks', Block)
+        return _to_class_list(self._data, 'blocks', Block)
 
     @property
     def children(self) -> List['Node']:
-        return _to_class_list(self, 'children', Node)
+        return _to_class_list(self._data, 'children', Node)
+
 
+class RunProp(KdcObject):
+    __slots__ = ()
 
-class RunProp(dict):
     @property
     def size(self) -> int:
-        return self.get('size', 0)
+        return self._data.get('size', 0)
 
     @property
     def color(self) -> str:
-        return self.get('color', '')
+        return self._data.get('color', '')
 
     @property
     def font_ascii(self) -> str:
-        return self.get('font_ascii', '')
+        return self._data.get('font_ascii', '')
 
     @property
     def font_east_asia(self) -> str:
-        return self.get('font_east_asia', '')
+        return self._data.get('font_east_asia', '')
 
     @property
     def bold(self) -> bool:
-        return self.get('bold', False)
+        return self._data.get('bold', False)
 
     @property
     def italic(self) -> bool:
-        return self.get('italic', False)
+        return self._data.get('italic', False)
 
     @property
     def underline(self) -> bool:
-        return self.get('underline', False)
+        return self._data.get('underline', False)
 
     @property
     def strike(self) -> bool:
-        return self.get('strike', False)
+        return self._data.get('strike', False)
+
 
+class Run(KdcObject):
+    __slots__ = ()
 
-class Run(dict):
     @property
     def prop(self) -> RunProp:
-        return RunProp(self.get('prop', {}))
+        return RunProp(self._data.get('prop', {}))
 
     @property
     def id(self) -> str:
-        return self.get('id', '')
+        return self._data.get('id', '')
 
     @property
     def text(self) -> str:
-        return self.get('text', '')
+        return self._data.get('text', '')
 
 
 ParaAlignment = Literal['left', 'right', 'center', 'justify', 'distribute', 'fill', 'center_continuous']
 
 
-class ParaProp(dict):
+class ParaProp(KdcObject):
+    __slots__ = ()
+
     @property
     def alignment(self) -> ParaAlignment:
-        return self.get('alignment', )
+        return self._data.get('alignment', )
 
     @property
     def def_run_prop(self) -> RunProp:
-        return RunProp(self.get('def_run_prop', {}))
+        return RunProp(self._data.get('def_run_prop', {}))
 
     @property
     def outline_level(self) -> int:
-        return self.get('outline_level', 10)
+        return self._data.get('outline_level', 10)
 
     @property
     def list_string(self) -> str:
-        return self.get('list_string', '')
+        return self._data.get('list_string', '')
+
 
+class Para(KdcObject):
+    __slots__ = ()
 
-class Para(dict):
     @property
     def runs(self) -> List[Run]:
-        return _to_class_list(self, 'runs', Run)
+        return _to_class_list(self._data, 'runs', Run)
 
     @property
     def prop(self) -> ParaProp:
-        return ParaProp(self.get('prop', {}))
+        return ParaProp(self._data.get('prop', {}))
 
 
-class TableCell(dict):
+class TableCell(KdcObject):
+    __slots__ = ()
+
     @property
     def blocks(self) -> List['Block']:
-        return _to_class_list(self, 'blocks', Block)
+        return _to_class_list(self._data, 'blocks', Block)
 
     @property
     def row_span(self) -> int:
-        return self.get('row_span', 1)
+        return self._data.get('row_span', 1)
 
     @property
     def col_span(self) -> int:
-        return self.get('col_span', 1)
+        return self._data.get('col_span', 1)
 
     @property
     def id(self) -> str:
-        return self.get('id', '')
+        return self._data.get('id', '')
+
 
+class TableRow(KdcObject):
+    __slots__ = ()
 
-class TableRow(dict):
     @property
     def cells(self) -> List[TableCell]:
-        return _to_class_list(self, 'cells', TableCell)
+        return _to_class_list(self._data, 'cells', TableCell)
 
 
-class Table(dict):
+class Table(KdcObject):
+    __slots__ = ()
+
     @property
     def rows(self) -> List[TableRow]:
-        return _to_class_list(self, 'rows', TableRow)
+        return _to_class_list(self._data, 'rows', TableRow)
+
 
+class Textbox(KdcObject):
+    __slots__ = ()
 
-class Textbox(dict):
     @property
     def blocks(self) -> List['Block']:
-        return _to_class_list(self, 'blocks', Block)
+        return _to_class_list(self._data, 'blocks', Block)
 
 
 ComponentType = Literal['image', 'audio', 'video']
 
 
-class Media(dict):
+class Media(KdcObject):
+    """
+    媒体资源的句柄。内容保存在path指向的本地文件中，或以base64保存在data中（旧的缓存文件），只有调用read_bytes或
+    save时才读取或解码。parse_file_content解析的媒体只记录download_url和media_dir，首次调用read_bytes或save时
+    才下载到media_dir并记录path。
+    """
+    __slots__ = ()
+
     @property
     def id(self) -> str:
-        return self['id']
+        return self._data['id']
 
     @property
     def data(self) -> str:
-        return self.get('data')
+        return self._data.get('data')
+
+    @property
+    def path(self) -> str:
+        return self._data.get('path')
+
+    @property
+    def has_content(self) -> bool:
+        """
+        是否有内容（本地文件、base64数据或尚未下载的媒体）
+        """
+        return bool(self.path or self.data or self._data.get('download_url'))
+
+    def _local_path(self) -> str:
+        """
+        返回本地文件路径，媒体尚未下载时先下载到media_dir
+        """
+        if not self.path and self._data.get('download_url'):
+            self._data['path'] = _download_media(self._data['download_url'], self._data['media_dir'])
+        return self.path
+
+    def read_bytes(self) -> bytes:
+        path = self._local_path()
+        if path:
+            with open(path, 'rb') as f:
+                return f.read()
+        if self.data:
+            return base64decode(self.data)
+        raise ValueError(f'media {self.id} has no local content')
+
+    def save(self, dest: str):
+        """
+        将内容写入dest，文件内容直接复制，不读入内存
+        """
+        path = self._local_path()
+        if path:
+            shutil.copyfile(path, dest)
+            return
+        with open(dest, 'wb') as f:
+            f.write(self.read_bytes())
 
     @property
     def mime_type(self) -> str:
-        return self.get('mime_type')
+        return self._data.get('mime_type')
 
     @property
     def url(self) -> str:
-        return self.get('url')
+        return self._data.get('url')
 
 
-class Component(dict):
+class Component(KdcObject):
+    __slots__ = ()
+
     @property
     def type(self) -> ComponentType:
-        return self.get('type', '')
+        return self._data.get('type', '')
 
     @property
     def media_id(self) -> str:
-        return self['media_id']
+        return self._data['media_id']
+
 
+class Drawing(KdcObject):
+    __slots__ = ()
 
-class Drawing(dict):
     @property
     def media_id(self) -> str:
-        return self.get('media_id')
+        return self._data.get('media_id')
 
     @property
     def type(self) -> str:
-        return self.get('type')
+        return self._data.get('type')
 
     @property
     def url(self) -> str:
-        return self.get('url')
+        return self._data.get('url')
 
 
-class Block(dict):
+class Block(KdcObject):
+    __slots__ = ()
+
     @property
     def type(self) -> BlockType:
-        return self['type']
+        return self._data['type']
 
     @property
     def para(self) -> Para:
-        return Para(self['para'])
+        return Para(self._data['para'])
 
     @property
     def table(self) -> Table:
-        return Table(self['table'])
+        return Table(self._data['table'])
 
     @property
     def component(self) -> Component:
-        return Component(self['component'])
+        return Component(self._data['component'])
 
     @property
     def textbox(self) -> Textbox:
-        return Textbox(self['textbox'])
+        return Textbox(self._data['textbox'])
 
     @property
     def drawing(self) -> Drawing:
-        return Drawing(self['drawing'])
+        return Drawing(self._data['drawing'])
+
 
+class Slide(KdcObject):
+    __slots__ = ()
 
-class Slide(dict):
     @property
     def shape_tree(self) -> List[Block]:
-        return _to_class_list(self, 'shape_tree', Block)
+        return _to_class_list(self._data, 'shape_tree', Block)
 
 
-class SlideContainer(dict):
+class SlideContainer(KdcObject):
+    __slots__ = ()
+
     @property
     def category(self) -> str:
-        return self.get('category', '')
+        return self._data.get('category', '')
 
     @property
     def slides(self) -> List[Slide]:
-        return _to_class_list(self, 'slides', Slide)
+        return _to_class_list(self._data, 'slides', Slide)
+
 
+class Comment(KdcObject):
+    __slots__ = ()
 
-class Comment(dict):
-    pass
 
+class DocProp(KdcObject):
+    __slots__ = ()
 
-class DocProp(dict):
     @property
     def page_count(self) -> int:
-        return self.get('page_count', 0)
+        return self._data.get('page_count', 0)
 
     @property
     def page_props(self) -> list:
@@ -263,58 +369,87 @@ class DocProp(dict):
         return []
 
 
-class PresProp(dict):
+class PresProp(KdcObject):
+    __slots__ = ()
+
     @property
     def slide_size(self) -> dict:
-        return self.get('slide_size', {})
+        return self._data.get('slide_size', {})
 
     @property
     def note_size(self) -> dict:
         # todo
-        return self.get('note_size', {})
+        return self._data.get('note_size', {})
 
 
-class Document(dict):
+class MediaOwner(KdcObject):
+    """
+    带有媒体资源的根对象（Document、Presentation）的基类。media(id)通过id到Media的索引查找，
+    索引在首次查找时建立；原始字典中的medias数组被替换、增删元素或原地替换元素后，medias和索引都会重新建立。
+    支持弱引用，以便媒体文件所在的临时目录随对象一起删除。
+    """
+    __slots__ = ('_medias', '_media_index', '__weakref__')
+
     @property
-    def prop(self) -> DocProp:
+    def medias(self) -> List[Media]:
         """
-        文档属性
+        媒体资源文件，图片、音视频等
         """
-        return DocProp(self.get('prop', {}))
+        source = self._data.get('medias') or ()
+        medias = getattr(self, '_medias', None)
+        # 逐个比较元素的身份，包装对象引用着原来的元素，因此id不会被新元素重用
+        if medias is not None and len(medias) == len(source) and all(
+                m._data is x for m, x in zip(medias, source)):
+            return medias
+        self._medias = _to_class_list(self._data, 'medias', Media)
+        self._media_index = None
+        return self._medias
+
+    def media(self, id: str) -> Media:
+        medias = self.medias
+        if self._media_index is None:
+            index = {}
+            for m in medias:
+                # id重复时与按顺序查找一样返回第一个
+                if 'id' in m:
+                    index.setdefault(m.id, m)
+            self._media_index = index
+        try:
+            return self._media_index[id]
+        except KeyError:
+            raise KeyError(f'media {id} not found') from None
+
+
+class Document(MediaOwner):
+    __slots__ = ()
 
     @property
-    def blocks(self) -> List[Block]:
+    def prop(self) -> DocProp:
         """
-        文档的内容按顺序组织成一个数组。tree与blocks字段必须有一个存在。
+        文档属性
         """
-        return _to_class_list(self, 'blocks', Block)
-
-    def media(self, id: str) -> Media:
-        for m in self.medias:
-            if m.id == id:
-                return m
-        raise KeyError(f'media {id} not found')
+        return DocProp(self._data.get('prop', {}))
 
     @property
-    def medias(self) -> List[Media]:
+    def blocks(self) -> List[Block]:
         """
-        文档中的媒体对象组织成一个数组
+        文档的内容按顺序组织成一个数组。tree与blocks字段必须有一个存在。
         """
-        return _to_class_list(self, 'medias', Media)
+        return _to_class_list(self._data, 'blocks', Block)
 
     @property
     def comments(self) -> List[Comment]:
         """
         文档中的所有批注（评论）体组织成一个数组
         """
-        return _to_class_list(self, 'comments', Comment)
+        return _to_class_list(self._data, 'comments', Comment)
 
     @property
     def tree(self) -> Node:
         """
         以大纲级别为层级，将文档的内容组织成一棵树。tree与blocks字段必须有一个存在。
         """
-        return Node(self['tree'])
+        return Node(self._data['tree'])
 
     def to_streamlit(self):
         StreamlitRenderer(self).render()
@@ -331,33 +466,22 @@ class Document(dict):
         return out.getvalue()
 
 
-class Presentation(dict):
+class Presentation(MediaOwner):
+    __slots__ = ()
+
     @property
     def prop(self) -> PresProp:
         """
         画布大小属性
         """
-        return PresProp(self.get('prop', {}))
+        return PresProp(self._data.get('prop', {}))
 
     @property
     def slide_containers(self) -> List[SlideContainer]:
         """
         幻灯片、母版、版式容器对象
         """
-        return _to_class_list(self, 'slide_containers', SlideContainer)
-
-    def media(self, id: str) -> Media:
-        for m in self.medias:
-            if m.id == id:
-                return m
-        raise KeyError(f'media {id} not found')
-
-    @property
-    def medias(self) -> List[Media]:
-        """
-        媒体资源文件，图片、音视频等
-        """
-        return _to_class_list(self, 'medias', Media)
+        return _to_class_list(self._data, 'slide_containers', SlideContainer)
 
     # def to_streamlit(self):
     #     StreamlitRenderer(self).render()
@@ -533,7 +657,7 @@ class HTMLRenderer:
     def _format_media(self, media: Media, out: IOBase):
         if media.url:
             url = media.url.replace('ks3-cn-beijing-internal', 'ks3-cn-beijing')
-        elif media.data:
+        elif media.has_content:
             url = f"{self.media_dir}/{media.id}"
 
         out.write(f'<img src="{url}" style="width:100%;max-width:fit-content;">\n')
@@ -695,7 +819,7 @@ class PPTHTMLRenderer:
     def _format_media(self, media: Media, out: IOBase):
         if media.url:
             url = media.url.replace('ks3-cn-beijing-internal', 'ks3-cn-beijing')
-        elif media.data:
+        elif media.has_content:
             url = f"{self.media_dir}/{media.id}"
 
         # out.write(f'<img src="{url}" style="width:100%;max-width:fit-content;">\n')
@@ -760,7 +884,8 @@ class MarkdownRender:
     def __init__(self, doc: Document, media_dir: str):
         self.doc = doc
         self.media_dir = media_dir
-        self.images = {}
+        # 渲染中引用的本地媒体，值为Media句柄，需要内容时调用read_bytes或save
+        self.images: dict[str, Media] = {}
 
     def render(self, out: IOBase):
         self._render_node(self.doc.tree, out)
@@ -827,8 +952,8 @@ class MarkdownRender:
             if media.url:
                 url = media.url.replace('ks3-cn-beijing-internal', 'ks3-cn-beijing')
                 out.write(f'![]({url})\n\n')
-            elif media.data:
-                self.images[media.id] = base64decode(media.data)
+            elif media.has_content:
+                self.images[media.id] = media
                 out.write(f'![]({self.media_dir}/{media.id})\n\n')
 
     def _render_component(self, block: Component, out: IOBase):
@@ -838,8 +963,8 @@ class MarkdownRender:
             if media.url:
                 url = media.url.replace('ks3-cn-beijing-internal', 'ks3-cn-beijing')
                 out.write(f'![]({url})\n\n')
-            elif media.data:
-                self.images[media.id] = base64decode(media.data)
+            elif media.has_content:
+                self.images[media.id] = media
                 out.write(f'![]({self.media_dir}/{media.id})\n\n')
 
     def _render_para(self, para: Para) -> str:
@@ -901,7 +1026,37 @@ def _render_file_kdc(name: str, content: bytes) -> dict:
     return resp.json()['data']
 
 
-def parse_file_content(name: str, content: bytes, cache: bool = True):
+def _download_media(url: str, media_dir: str) -> str:
+    """
+    流式下载媒体文件到media_dir，文件以内容的sha1命名，返回文件路径
+    """
+    os.makedirs(media_dir, exist_ok=True)
+    with requests.get(url, stream=True) as resp:
+        if resp.status_code != 200:
+            raise Exception(f'fetch media {url} failed with {resp.status_code}')
+
+        h = hashlib.sha1()
+        fd, tmp_path = tempfile.mkstemp(dir=media_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in resp.iter_content(chunk_size=_media_chunk_size):
+                    h.update(chunk)
+                    f.write(chunk)
+            path = f'{media_dir}/{h.hexdigest()}'
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return path
+
+
+def parse_file_content(name: str, content: bytes, cache: bool = True, media_dir: str = None):
+    """
+    解析文件为KDC文档。媒体文件不在解析时下载，只在首次调用Media.read_bytes或save时下载到media_dir（渲染HTML
+    不需要媒体内容，因此不会下载）。media_dir未指定时：cache为True则使用缓存目录下的media目录并保留；
+    cache为False则使用临时目录，该目录在返回的文档对象被回收时删除。
+    """
     file_hash = _bytes_hash(content)
     cache_path = f'{_cache_path}/kdc_{file_hash}.json'
     # 获取name的后缀名
@@ -917,20 +1072,31 @@ def parse_file_content(name: str, content: bytes, cache: bool = True):
         return Document(data['doc'])  # data['doc']是kdc格式数据，构造KDC文档的根对象（Document对象）
 
     data = _render_file_kdc(name, content)
-    if 'medias' in data['doc']:
-        for m in data['doc']['medias']:
-            if m['url']:
-                media_url = m['url'].replace('ks3-cn-beijing-internal', 'ks3-cn-beijing')
-                resp = requests.get(media_url)
-                if resp.status_code != 200:
-                    raise Exception(f'fetch media {media_url} failed with {resp.status_code}')
-                m['data'] = base64.b64encode(resp.content).decode('utf8')
-                m['url'] = ''
+    temp_media_dir = None
+    if media_dir is None:
+        if cache:
+            media_dir = f'{_cache_path}/media'
+        else:
+            media_dir = temp_media_dir = tempfile.mkdtemp(prefix='kdc_media_')
+    try:
+        if 'medias' in data['doc']:
+            for m in data['doc']['medias']:
+                if m['url']:
+                    # 只记录下载地址，需要内容时再下载到本地文件
+                    m['download_url'] = m['url'].replace('ks3-cn-beijing-internal', 'ks3-cn-beijing')
+                    m['media_dir'] = media_dir
+                    m['url'] = ''
+    except BaseException:
+        if temp_media_dir:
+            shutil.rmtree(temp_media_dir, ignore_errors=True)
+        raise
     match suffix:
         case 'pptx' | 'ppt':
             kdc = Presentation(data['doc'])
         case _:
             kdc = Document(data['doc'])
+    if temp_media_dir:
+        weakref.finalize(kdc, shutil.rmtree, temp_media_dir, ignore_errors=True)
 
     if cache:
         if not os.path.exists(_cache_path):
@@ -993,6 +1159,7 @@ def ppt_to_xml(file_path: str = None, download_link: str = None, download_dir: s
             name = os.path.basename(file_path)
 
         logging.debug(f"开始转换 PPT 为 XML")
+        # 渲染HTML不读取媒体内容，媒体文件不会被下载
         kdc = parse_file_content(name, content, cache)
         xml_content = kdc.to_html(media_dir='/media')
         if show_xml:
@@ -2,8 +2,8 @@ import os
 import random
 import logging
 import utils.load_env as load_env
-import markdown_to_ppt.markdown2ppt_node as markdown2ppt_node
 import markdown_to_ppt.ai_server as ai_server
+from modules.markdown_outline import MarkdownOutline
 
 markdown = """
 # 整改进度汇报 
@@ -35,7 +35,7 @@ def get_env_para(model_token_name):
 
 
 def gen_ppt(markdown):
-    ppt_root_node = markdown2ppt_node.tran_markdown_to_ppt_node(markdown)
+    ppt_root_node = MarkdownOutline(markdown).to_ppt_node()
     client = ai_server.AIServer(
         load_env.get_env_para("WPS_SID"),
         load_env.get_env_para("GEN_PPT_AK"),
@@ -3,11 +3,59 @@
 
 import re
 import logging
+from collections import namedtuple
+
+# 正则表达式中具有特殊含义的字符（'{'单独处理，只有构成量词时才是特殊字符）
+REGEX_METACHARACTERS = set('.^$*+?()[]|')
+# execution块模式中捕获Markdown内容的分组
+LAZY_GROUP = '(.*?)'
+# 从文件中流式提取时每次读取的字符数
+READ_CHUNK_SIZE = 1 << 20
+
+# 一对code/execution块的提取结果，start为code块的起始位置，end为execution块的结束位置（字符偏移）
+MarkdownBlock = namedtuple('MarkdownBlock', ['markdown', 'start', 'end'])
+
+
+def literal_pattern(pattern):
+    """
+    如果正则表达式模式只匹配一个固定字符串，返回该字符串，用于str.find快速查找。
+
+    参数:
+        pattern (str): 正则表达式模式。
+
+    返回:
+        str or None: 模式匹配的固定字符串，模式包含通配符、分组、量词等时返回None。
+    """
+    chars = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                # \d、\n、\1等转义序列不是单个字面字符
+                return None
+            chars.append(pattern[i + 1])
+            i += 2
+            continue
+        if char in REGEX_METACHARACTERS:
+            return None
+        chars.append(char)
+        i += 1
+    literal = ''.join(chars)
+    # '{'构成量词（如a{2}）时模式不会匹配字面字符串本身，以此排除
+    if re.fullmatch(pattern, literal, re.DOTALL) is None:
+        return None
+    return literal
+
 
 class MarkdownExtractor:
     """
     Markdown提取器类，用于从文本中提取目标Markdown内容。
 
+    两个模式在初始化时编译。code块模式是固定字符串、execution块模式是"固定字符串(.*?)固定字符串"时
+    （默认配置即是如此），改用str.find查找，耗时与文本长度成线性关系，且不会复制code块之后的文本；
+    其他模式使用编译后的正则表达式从指定位置开始查找。
+
     属性:
         CODE_BLOCK_PATTERN (str): 匹配code块的正则表达式模式。
         EXECUTION_BLOCK_PATTERN (str): 匹配execution块的正则表达式模式。
@@ -23,6 +71,17 @@ class MarkdownExtractor:
         """
         self.CODE_BLOCK_PATTERN = code_block_pattern
         self.EXECUTION_BLOCK_PATTERN = execution_block_pattern
+        self._code_block_regex = re.compile(code_block_pattern, re.DOTALL)
+        self._execution_block_regex = re.compile(execution_block_pattern, re.DOTALL)
+
+        # 可以用str.find代替正则表达式时的固定字符串
+        self._code_block_literal = literal_pattern(code_block_pattern)
+        self._execution_block_literals = None
+        head, sep, tail = execution_block_pattern.partition(LAZY_GROUP)
+        if sep:
+            start_marker, end_marker = literal_pattern(head), literal_pattern(tail)
+            if start_marker and end_marker:
+                self._execution_block_literals = (start_marker, end_marker)
 
     def extract_markdown(self, text):
         """
@@ -35,33 +94,168 @@ class MarkdownExtractor:
             str or None: 提取的Markdown内容，如果未找到则返回None。
         """
         logging.debug("开始提取Markdown内容。")
+        if not isinstance(text, str):
+            logging.warning("text不是字符串，无法提取Markdown内容。")
+            return None
+
         # 查找第一个code块的位置
-        code_block_match = re.search(self.CODE_BLOCK_PATTERN, text, re.DOTALL)
-        if not code_block_match:
+        code_block = self._find_code_block(text, 0)
+        if code_block is None:
             logging.warning("未找到目标code块。")
-            # print("未找到目标code块。")
             return None  # 未找到目标code块
+        code_block_end = code_block[1]
 
-        # logging.debug("找到目标code块。")
-        # snippet = text[code_block_match.start():code_block_match.end()]
-        # print(f"找到目标code块: {snippet}")
-
-        # 获取code块之后的文本
-        post_code_text = text[code_block_match.end():]
-
-        # 查找execution块
-        execution_block_match = re.search(self.EXECUTION_BLOCK_PATTERN, post_code_text, re.DOTALL)
-        if not execution_block_match:
+        # 从code块之后的位置开始查找execution块
+        execution_block = self._find_execution_block(text, code_block_end)
+        if execution_block is None:
             logging.warning("未找到execution块。")
             # 打印部分文本以帮助调试
-            snippet = post_code_text[:100] + "..." if len(post_code_text) > 100 else post_code_text
+            snippet = text[code_block_end:code_block_end + 100]
+            if len(text) - code_block_end > 100:
+                snippet += "..."
             logging.debug(f"post_code_text snippet: {snippet}")
             return None  # 未找到execution块
 
-            # 提取Markdown内容并去除前后空白字符
-        markdown = execution_block_match.group(1).strip()
-        # if markdown:
-        #     logging.info("成功提取Markdown内容。")
-        # else:
-        #     logging.warning("提取的Markdown内容为空。")
-        return markdown
\ No newline at end of file
+        # 提取Markdown内容并去除前后空白字符
+        return execution_block[0].strip()
+
+    def extract_many(self, texts):
+        """
+        批量提取一列text中的目标Markdown内容。
+
+        参数:
+            texts (iterable of str): 包含用户数据的文本，例如DataFrame的text列。
+
+        返回:
+            list of (str or None): 与texts一一对应的Markdown内容，未找到时为None。
+        """
+        return [self.extract_markdown(text) for text in texts]
+
+    def iter_markdown(self, text_or_file, chunk_size=READ_CHUNK_SIZE):
+        """
+        依次提取文本中所有的code/execution块对。每个code块之后的第一个execution块与之配对，
+        下一个code块从该execution块结束之后开始查找。
+
+        传入文件对象时按块读取并增量扫描，内存中只保留尚未配对完成的部分，适合从超大的日志文件中提取。
+        code块或execution块模式不是固定字符串时无法增量扫描，会先读取整个文件。
+
+        参数:
+            text_or_file (str or file-like): 文本，或以文本模式打开、提供read(size)方法的文件对象。
+            chunk_size (int): 从文件中每次读取的字符数。
+
+        返回:
+            generator of MarkdownBlock: 依次产出的提取结果，Markdown内容已去除前后空白字符，
+            偏移为在整个文本中的字符位置。
+        """
+        if isinstance(text_or_file, str):
+            return self._iter_text(text_or_file)
+        if self._code_block_literal is None or self._execution_block_literals is None:
+            logging.debug("模式不是固定字符串，读取整个文件后再提取。")
+            return self._iter_text(text_or_file.read())
+        return self._iter_stream(text_or_file, chunk_size)
+
+    def _iter_text(self, text):
+        """
+        依次提取内存中文本里所有的code/execution块对。
+        """
+        pos = 0
+        while True:
+            code_block = self._find_code_block(text, pos)
+            if code_block is None:
+                return
+            execution_block = self._find_execution_block(text, code_block[1])
+            if execution_block is None:
+                return
+            markdown, pos = execution_block
+            yield MarkdownBlock(markdown.strip(), code_block[0], pos)
+
+    def _iter_stream(self, f, chunk_size):
+        """
+        从文件中按块读取并增量提取所有的code/execution块对，只用于所有标记都是固定字符串的情况。
+        每个位置最多被查找一次，耗时与文件长度成线性关系。
+        """
+        code_marker = self._code_block_literal
+        start_marker, end_marker = self._execution_block_literals
+        # buffer[0]在整个文件中的偏移
+        base = 0
+        buffer = ''
+        # 下一次查找的起始位置（相对于buffer）
+        search_from = 0
+        # 0: 查找code块；1: 查找execution块的开始标记；2: 查找execution块的结束标记
+        state = 0
+        code_start = content_start = None
+        eof = False
+        while True:
+            if state == 0:
+                marker = code_marker
+            elif state == 1:
+                marker = start_marker
+            else:
+                marker = end_marker
+            found = buffer.find(marker, search_from)
+            if found < 0:
+                if eof:
+                    return
+                # 标记可能跨越两次读取，保留末尾不足一个标记长度的字符
+                search_from = max(search_from, len(buffer) - len(marker) + 1)
+                # 查找结束标记时需要保留Markdown内容，其他状态下可以丢弃已查找过的文本
+                keep_from = content_start if state == 2 else search_from
+                buffer = buffer[keep_from:]
+                base += keep_from
+                search_from -= keep_from
+                if state == 2:
+                    content_start = 0
+                data = f.read(chunk_size)
+                if data:
+                    buffer += data
+                else:
+                    eof = True
+                continue
+
+            if state == 0:
+                code_start = base + found
+                search_from = found + len(code_marker)
+                state = 1
+            elif state == 1:
+                content_start = found + len(start_marker)
+                search_from = content_start
+                state = 2
+            else:
+                search_from = found + len(end_marker)
+                yield MarkdownBlock(buffer[content_start:found].strip(), code_start, base + search_from)
+                content_start = None
+                state = 0
+
+    def _find_code_block(self, text, pos):
+        """
+        从pos开始查找第一个code块。
+
+        返回:
+            tuple or None: code块的(起始位置, 结束位置)，未找到时返回None。
+        """
+        if self._code_block_literal is not None:
+            start = text.find(self._code_block_literal, pos)
+            return None if start < 0 else (start, start + len(self._code_block_literal))
+        code_block_match = self._code_block_regex.search(text, pos)
+        return code_block_match.span() if code_block_match else None
+
+    def _find_execution_block(self, text, pos):
+        """
+        从pos开始查找第一个execution块。
+
+        返回:
+            tuple or None: execution块中捕获的内容（未去除空白）和execution块的结束位置，未找到时返回None。
+        """
+        if self._execution_block_literals is not None:
+            start_marker, end_marker = self._execution_block_literals
+            start = text.find(start_marker, pos)
+            if start < 0:
+                return None
+            start += len(start_marker)
+            # 第一个开始标记之后没有结束标记时，之后的开始标记也不会有，无需再查找
+            end = text.find(end_marker, start)
+            if end < 0:
+                return None
+            return text[start:end], end + len(end_marker)
+        execution_block_match = self._execution_block_regex.search(text, pos)
+        return (execution_block_match.group(1), execution_block_match.end()) if execution_block_match else None
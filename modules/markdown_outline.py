@@ -0,0 +1,194 @@
+# modules/markdown_outline.py
+# 功能：一次解析Markdown大纲（标题、级别、列表项和源文本偏移），供XML转换、PPT节点构建和打乱共用。
+
+import re
+import logging
+from collections import namedtuple
+
+# 大纲中的一行（不含空行）。
+# level: 标题级别，即去除空白后行首"#"的个数（"#"之后须紧跟空格），不是标题时为0；
+# text: 去除标题或"* "标记以及前后空白后的内容；
+# bullet: 是否为"* "开头的列表项；
+# raw: 源文本中的原始行（不含换行符）；
+# start: 该行在源文本中的字符偏移。
+OutlineNode = namedtuple('OutlineNode', ['level', 'text', 'bullet', 'raw', 'start'])
+
+# str.splitlines会拆分而str.split('\n')不会拆分的行分隔符
+EXTRA_LINE_BREAKS = re.compile('[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+
+# 创建slide的标题级别在日志中的名称
+HEADING_LEVEL_NAMES = ('一', '二', '三')
+
+
+def parse_line(raw, start):
+    """
+    解析一行Markdown。
+
+    参数:
+        raw (str): 原始行，可以带行尾换行符。
+        start (int): 该行在源文本中的字符偏移。
+
+    返回:
+        OutlineNode or None: 解析结果，空行返回None。
+    """
+    line = raw.strip()
+    if not line:
+        return None
+    if raw.endswith('\n'):
+        raw = raw[:-1]
+    if line[0] == '#':
+        level = len(line) - len(line.lstrip('#'))
+        if line[level:level + 1] == ' ':
+            return OutlineNode(level, line[level + 1:].strip(), False, raw, start)
+    if line.startswith('* '):
+        return OutlineNode(0, line[2:].strip(), True, raw, start)
+    return OutlineNode(0, line, False, raw, start)
+
+
+def iter_outline(lines):
+    """
+    逐行解析Markdown，跳过空行。
+
+    参数:
+        lines (iterable of str): Markdown文本的各行，可以带行尾换行符（例如打开的文件）。
+
+    返回:
+        generator of OutlineNode: 每个非空行的解析结果。
+    """
+    start = 0
+    for raw in lines:
+        node = parse_line(raw, start)
+        if node is not None:
+            yield node
+        start += len(raw) if raw.endswith('\n') else len(raw) + 1
+
+
+def iter_slides(nodes):
+    """
+    按标题级别将大纲划分为slide：一、二、三级标题开始新slide，四级标题和正文添加到当前slide。
+    在下一个标题出现或输入结束时产出已完成的slide。
+
+    参数:
+        nodes (iterable of OutlineNode): 大纲中的各行。
+
+    返回:
+        generator of tuple: 每个slide的(slide_id, 内容列表)，内容列表中的每一项对应一个<p>元素。
+    """
+    current_slide = None
+    # 当前slide是否属于输出（正文之前没有标题时创建的slide不输出）
+    current_in_output = False
+    slide_id = 1
+
+    for node in nodes:
+        if 1 <= node.level <= 3:
+            # 一、二、三级标题 - 结束当前slide并创建新slide
+            if current_in_output:
+                yield current_slide
+            current_slide = (slide_id, [node.text])
+            current_in_output = True
+            slide_id += 1
+            logging.debug(f"创建{HEADING_LEVEL_NAMES[node.level - 1]}级标题slide")
+
+        elif node.level == 4:
+            # 四级标题 - 添加到当前slide
+            if current_slide is not None:
+                current_slide[1].append(node.text)
+                logging.debug(f"添加四级标题到当前slide")
+            else:
+                logging.warning("当前没有活动的slide，无法添加四级标题。")
+
+        else:
+            # 正文内容 - 添加到当前 slide（五级及以下的标题按正文处理，保留"#"标记）
+            content = node.raw.strip() if node.level else node.text
+            if current_slide is None:
+                # 与原来的实现保持一致：此时创建的slide不加入输出，只消耗一个slide_id
+                current_slide = (slide_id, [content])
+                slide_id += 1
+                logging.debug(f"创建正文内容slide")
+            else:
+                current_slide[1].append(content)
+                logging.debug(f"添加正文内容到当前slide")
+
+    if current_in_output:
+        yield current_slide
+
+
+class MarkdownOutline:
+    """
+    Markdown大纲类。对一行数据的Markdown只解析一次，XML转换、打乱和PPT节点构建都使用同一份解析结果。
+
+    属性:
+        source (str): 源Markdown文本。
+        first_line (str): 源文本的第一行（可能为空行），PPT节点构建时用作标题。
+        nodes (list of OutlineNode): 各非空行的解析结果。
+    """
+
+    def __init__(self, markdown):
+        """
+        初始化MarkdownOutline类并解析Markdown文本。
+
+        参数:
+            markdown (str): 需要解析的Markdown文本。
+        """
+        self.source = markdown
+        end = markdown.find('\n')
+        self.first_line = markdown if end < 0 else markdown[:end]
+        self.nodes = list(iter_outline(markdown.split('\n')))
+
+    def slides(self):
+        """
+        按标题级别划分slide。
+
+        返回:
+            list of tuple: 每个slide的(slide_id, 内容列表)。
+        """
+        return list(iter_slides(self.nodes))
+
+    def to_ppt_node(self):
+        """
+        构建生成PPT所需的节点树，结果与markdown2ppt_node.tran_markdown_to_ppt_node相同：
+        第一行为标题，二级及以下标题按级别挂到最近的上级标题下，标题之间的正文合并为一个子节点。
+
+        与转换XML不同，这里按原始行判断标题（行首不能有空白）。源文本含有换行符以外的行分隔符
+        或为空时，直接调用tran_markdown_to_ppt_node以保持结果一致。
+
+        返回:
+            RootNode: PPT根节点。
+        """
+        from markdown_to_ppt.ai_server import PPTNode, RootNode
+        from markdown_to_ppt.markdown2ppt_node import seek_last_node, reset_level, tran_markdown_to_ppt_node
+
+        if not self.source or EXTRA_LINE_BREAKS.search(self.source):
+            return tran_markdown_to_ppt_node(self.source)
+
+        root_node = PPTNode(text=self.first_line.lstrip("# "), level=0, children=[])
+        temp_content_lines = []
+        pre_node = root_node
+        for node in self.nodes:
+            if node.start == 0:
+                continue  # 第一行已作为标题
+            raw = node.raw
+            level = len(raw) - len(raw.lstrip('#'))
+            if level <= 1 or raw[level:level + 1] != ' ':
+                temp_content_lines.append(raw)
+                continue
+            if temp_content_lines:
+                pre_node.children.append(PPTNode(
+                    text="\n".join(temp_content_lines).lstrip("* "),
+                    level=pre_node.level + 1,
+                    children=[]
+                ))
+            current_node = PPTNode(text=raw[level + 1:], level=level - 1, children=[])
+            seek_last_node(root_node, level - 2).children.append(current_node)
+            temp_content_lines = []
+            pre_node = current_node
+
+        if temp_content_lines:
+            pre_node.children.append(PPTNode(
+                text="\n".join(temp_content_lines).lstrip("* "),
+                level=pre_node.level + 1,
+                children=[]
+            ))
+
+        reset_level(root_node)
+        return RootNode(text=root_node.text, children=root_node.children)
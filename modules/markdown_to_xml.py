@@ -2,15 +2,95 @@
 # 功能：将提取的Markdown文本转换为XML格式。
 
 import xml.etree.ElementTree as ET
+import os
 import logging
+import re
+import concurrent.futures
 from xml.dom import minidom
+from modules.markdown_outline import MarkdownOutline, iter_outline, iter_slides
+
+# XML 1.0不允许出现的字符（以及无法编码为UTF-8的代理字符）
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+
+def _minidom_escapes_quotes():
+    """
+    检测当前Python版本的minidom在文本节点中是否把双引号转义为&quot;（Python 3.13起不再转义）。
+    """
+    return '&quot;' in minidom.parseString('<p>"</p>').documentElement.toxml()
+
+
+ESCAPE_TEXT_QUOTES = _minidom_escapes_quotes()
+
+
+def _escape_text(text):
+    """
+    按minidom的规则转义文本节点的内容。
+    """
+    text = text.replace('&', '&amp;').replace('<', '&lt;')
+    if ESCAPE_TEXT_QUOTES:
+        text = text.replace('"', '&quot;')
+    return text.replace('>', '&gt;')
+
+
+def _text_element(tag, text):
+    """
+    生成只包含文本的元素，与minidom美化后的输出一致：空文本输出自闭合标签；
+    文本中的回车符在解析时被规范化为换行，文本跨多行时美化后产生的空行会被移除。
+    """
+    if not text:
+        return f'<{tag}/>'
+    element = f'<{tag}>{_escape_text(text)}</{tag}>'
+    if '\r' in text or '\n' in text:
+        element = '\n'.join(line for line in element.replace('\r', '\n').split('\n') if line.strip())
+    return element
+
+
+def render_paragraph(content):
+    """
+    生成一个<p>元素的XML片段。
+
+    参数:
+        content (str): <p>的文本内容。
+
+    返回:
+        str: <p>元素的XML片段。
+    """
+    return _text_element('p', content)
+
+
+def render_slide(slide_id, paragraphs):
+    """
+    用已生成的<p>元素拼接单个slide的XML片段，没有<p>时输出自闭合标签。
+
+    参数:
+        slide_id (int or str): slide的id。
+        paragraphs (list of str): render_paragraph生成的<p>元素。
+
+    返回:
+        str: slide的XML片段。
+    """
+    if not paragraphs:
+        return f'<slide id="{slide_id}"/>'
+    return '\n'.join([f'<slide id="{slide_id}">', *paragraphs, '</slide>'])
+
+
+def _convert_many(markdowns):
+    """
+    在工作进程中转换一批Markdown文本，为None的项保持为None。
+    """
+    converter = MarkdownToXMLConverter()
+    return [None if markdown is None else converter.convert(markdown) for markdown in markdowns]
+
 
 class MarkdownToXMLConverter:
     """
     Markdown到XML转换器类，用于将Markdown文本转换为指定格式的XML。
 
+    convert不修改实例状态，每次转换的slide编号都从1开始，同一个实例可以在多个线程中共享。
+
     属性:
-        slide_id (int): 当前slide的ID，初始为1。
+        slide_id (int): 保留用于兼容，转换时不再使用。
     """
 
     def __init__(self):
@@ -21,7 +101,7 @@ class MarkdownToXMLConverter:
 
     def reset_id(self):
         """
-        重置slide_id为1，用于每次转换开始时。
+        重置slide_id为1。convert已不依赖实例状态，保留此方法用于兼容旧的调用方式。
         """
         self.slide_id = 1
         logging.debug("重置slide_id为1。")
@@ -33,91 +113,129 @@ class MarkdownToXMLConverter:
         参数:
             markdown (str): 需要转换的Markdown文本。
 
+        返回:
+            str: 转换后的XML字符串。
+        """
+        return self.convert_outline(MarkdownOutline(markdown))
+
+    def convert_outline(self, outline):
+        """
+        将已解析的Markdown大纲转换为XML格式的字符串。
+
+        参数:
+            outline (MarkdownOutline): Markdown大纲。
+
         返回:
             str: 转换后的XML字符串。
         """
         logging.debug("开始将Markdown转换为XML。")
-        lines = markdown.split('\n')
+        slides = outline.slides()
+
+        # 内容中含有XML不允许的字符时，沿用原来的ElementTree+minidom流程（与之前一样会抛出异常）
+        if any(INVALID_XML_CHARS.search(content) for _, contents in slides for content in contents):
+            pretty_xml = self._serialize_minidom(slides)
+        else:
+            pretty_xml = self.serialize_slides(slides)
+
+        logging.debug("成功将Markdown转换为指定的XML。")
+        return pretty_xml
+
+    def convert_batch(self, markdowns, workers=None, chunksize=None):
+        """
+        使用进程池批量转换Markdown文本，适合转换整列数据。
+
+        参数:
+            markdowns (iterable of str): 需要转换的Markdown文本，None会原样保留。
+            workers (int or None): 工作进程数，None表示使用CPU核数，1表示在当前进程中转换。
+            chunksize (int or None): 每次提交给工作进程的文本数，None时按进程数自动划分，
+                使每个进程约分到4批，减少进程间通信的次数。
+
+        返回:
+            list of (str or None): 与markdowns一一对应的XML字符串。
+        """
+        markdowns = list(markdowns)
+        if workers == 1 or len(markdowns) <= 1:
+            return _convert_many(markdowns)
+
+        workers = workers or os.cpu_count() or 1
+        if chunksize is None:
+            chunksize = max(1, -(-len(markdowns) // (workers * 4)))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = [markdowns[i:i + chunksize] for i in range(0, len(markdowns), chunksize)]
+            logging.debug(f"使用进程池转换 {len(markdowns)} 条Markdown，共 {len(chunks)} 批。")
+            results = []
+            for converted in executor.map(_convert_many, chunks):
+                results.extend(converted)
+        return results
+
+    def convert_iter(self, lines):
+        """
+        流式转换Markdown：每当下一个标题结束当前slide时立即产出该slide的XML片段，内存中只保留一个slide。
+
+        将所有片段用换行连接后放在"<slides>"和"</slides>"两行之间，与convert的结果相同
+        （没有任何slide时convert的结果为"<slides/>"）。
+
+        参数:
+            lines (iterable of str or str): Markdown文本的各行（可以带行尾换行符），例如打开的文件；
+                传入字符串时按换行符拆分。
+
+        返回:
+            generator of str: 每个slide的XML片段，形如'<slide id="1">\n<p>...</p>\n</slide>'。
+
+        异常:
+            ValueError: 如果slide的内容中含有XML不允许的字符。
+        """
+        if isinstance(lines, str):
+            lines = lines.split('\n')
+        for slide_id, contents in iter_slides(iter_outline(lines)):
+            if any(INVALID_XML_CHARS.search(content) for content in contents):
+                raise ValueError(f"第{slide_id}个slide的内容中含有XML不允许的字符。")
+            yield self._serialize_slide(slide_id, contents)
+
+    @staticmethod
+    def serialize_slides(slides):
+        """
+        一次性拼接出与ElementTree+minidom美化后相同的XML字符串：
+        每个标签独占一行，<p>的文本与标签在同一行，没有slide时输出<slides/>。
+
+        参数:
+            slides (list of tuple): MarkdownOutline.slides的返回值。
+
+        返回:
+            str: XML字符串。
+        """
+        if not slides:
+            return '<slides/>'
+        parts = ['<slides>']
+        for slide_id, contents in slides:
+            parts.append(MarkdownToXMLConverter._serialize_slide(slide_id, contents))
+        parts.append('</slides>')
+        return '\n'.join(parts)
+
+    @staticmethod
+    def _serialize_slide(slide_id, contents):
+        """
+        拼接单个slide的XML片段。
+        """
+        return render_slide(slide_id, [render_paragraph(content) for content in contents])
+
+    @staticmethod
+    def _serialize_minidom(slides):
+        """
+        使用ElementTree生成XML，再经minidom美化并移除空行（原来的实现）。
+
+        参数:
+            slides (list of tuple): MarkdownOutline.slides的返回值。
+
+        返回:
+            str: XML字符串。
+        """
         root = ET.Element('slides')  # 创建根元素
-        xml_slides = []
-        current_slide = None
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue  # 跳过空行
-
-            # 判断当前行的标题级别
-            if line.startswith('# '):
-                # 一级标题 - 创建新slide
-                content = line[2:].strip()
-                current_slide = self._create_slide(content)
-                root.append(current_slide)
-                logging.debug(f"创建一级标题slide")
-
-            elif line.startswith('## '):
-                # 二级标题 - 创建新slide
-                content = line[3:].strip()
-                current_slide = self._create_slide(content)
-                root.append(current_slide)
-                logging.debug(f"创建二级标题slide")
-
-            elif line.startswith('### '):
-                # 三级标题 - 创建新slide
-                content = line[4:].strip()
-                current_slide = self._create_slide(content)
-                root.append(current_slide)
-                logging.debug(f"创建三级标题slide")
-
-            elif line.startswith('#### '):
-                # 四级标题 - 添加到当前slide
-                content = line[5:].strip()
-                if current_slide is not None:
-                    p = ET.SubElement(current_slide, 'p')
-                    p.text = content
-                    logging.debug(f"添加四级标题到当前slide")
-                    # p = ET.Element('p')
-                    # p.text = content
-                    # try:
-                    #     slide_elem = ET.fromstring(current_slide)
-                    #     slide_elem.append(p)
-                    #     current_slide = ET.tostring(slide_elem, encoding='unicode')
-                    #     xml_slides[-1] = current_slide
-                    #     logging.debug(f"添加四级标题到当前slide: {content}")
-                    # except ET.ParseError as e:
-                    #     logging.error(f"解析XML时出错: {e}")
-                else:
-                    logging.warning("当前没有活动的slide，无法添加四级标题。")
-
-            else:
-                # 正文内容 - 添加到当前 slide
-                if line.startswith('* '):
-                    line = line[2:].strip()
-                if current_slide is None:
-                    current_slide = self._create_slide(line)
-                    logging.debug(f"创建正文内容slide")
-                else:
-                    if current_slide is not None:
-                        p = ET.SubElement(current_slide, 'p')
-                        p.text = line
-                        logging.debug(f"添加正文内容到当前slide")
-                        # p = ET.Element('p')
-                        # p.text = line
-                        # try:
-                        #     slide_elem = ET.fromstring(current_slide)
-                        #     slide_elem.append(p)
-                        #     current_slide = ET.tostring(slide_elem, encoding='unicode')
-                        #     xml_slides[-1] = current_slide
-                        #     logging.debug(f"添加正文内容到当前slide: {line}")
-                        # except ET.ParseError as e:
-                        #     logging.error(f"解析XML时出错: {e}")
-                    else:
-                        logging.warning("当前没有活动的slide，无法添加正文内容。")
-
-        # # 生成XML字符串
-        # xml_content = "\n".join(xml_slides)
-        # logging.debug("成功将Markdown转换为XML。")
-        # return xml_content
+        for slide_id, contents in slides:
+            slide = ET.SubElement(root, 'slide', id=str(slide_id))
+            for content in contents:
+                p = ET.SubElement(slide, 'p')
+                p.text = content
 
         # 生成初步的XML字符串
         rough_string = ET.tostring(root, 'utf-8')
@@ -125,10 +243,7 @@ class MarkdownToXMLConverter:
         reparsed = minidom.parseString(rough_string)
         pretty_xml = reparsed.toprettyxml(indent="")
         # 移除多余的空行
-        pretty_xml = '\n'.join([line for line in pretty_xml.split('\n') if line.strip() and not line.startswith('<?xml')])
-
-        logging.debug("成功将Markdown转换为指定的XML。")
-        return pretty_xml
+        return '\n'.join([line for line in pretty_xml.split('\n') if line.strip() and not line.startswith('<?xml')])
 
     def _create_slide_str(self, content):
         """
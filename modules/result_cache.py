@@ -0,0 +1,156 @@
+# modules/result_cache.py
+# 功能：以内容哈希为键记忆转换和打乱的结果，重复的Markdown只需一次哈希查找。
+
+import os
+import gzip
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+
+# 内存中默认最多保留的结果数
+RESULT_CACHE_SIZE = 10000
+
+
+class ResultCache:
+    """
+    结果记忆缓存类。键由流水线版本、结果类别（如'convert'、'shuffle'）和输入内容共同计算SHA-256哈希，
+    流水线版本变化时之前的结果全部失效。
+
+    内存中按最近最少使用（LRU）的顺序最多保留max_entries个结果；设置了cache_dir时结果同时以gzip压缩的JSON
+    保存到磁盘，重新运行时内存中未命中的结果从磁盘读取。结果须可序列化为JSON。
+
+    属性:
+        version (str): 流水线版本。
+        max_entries (int): 内存中最多保留的结果数。
+        cache_dir (str or None): 磁盘缓存目录。
+        hits (dict): 每个类别的命中次数。
+        misses (dict): 每个类别的未命中次数。
+    """
+
+    def __init__(self, version, max_entries=RESULT_CACHE_SIZE, cache_dir=None):
+        """
+        初始化ResultCache类。
+
+        参数:
+            version: 流水线版本，转换或打乱的输出格式变化时应随之变化。
+            max_entries (int): 内存中最多保留的结果数。
+            cache_dir (str or None): 磁盘缓存目录，不存在时在首次写入时创建；为None时只使用内存。
+        """
+        self.version = str(version)
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.hits = {}
+        self.misses = {}
+        self._entries = OrderedDict()
+
+    def key(self, kind, *parts):
+        """
+        计算结果的键。
+
+        参数:
+            kind (str): 结果类别。
+            *parts: 决定结果的输入内容，按str()转换后参与哈希。
+
+        返回:
+            str: 十六进制的SHA-256哈希。
+        """
+        sha256 = hashlib.sha256(self.version.encode('utf-8'))
+        for part in (kind, *parts):
+            sha256.update(b'\0')
+            sha256.update(str(part).encode('utf-8'))
+        return sha256.hexdigest()
+
+    def get_or_compute(self, kind, parts, compute):
+        """
+        获取已记忆的结果，没有时调用compute计算并记忆。
+
+        参数:
+            kind (str): 结果类别。
+            parts (tuple): 决定结果的输入内容。
+            compute (callable): 无参数的计算函数，抛出异常时不记忆结果。
+
+        返回:
+            计算结果（从磁盘读取时，元组会变为列表）。
+        """
+        key = self.key(kind, *parts)
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        elif self.cache_dir:
+            value = self._load(kind, key)
+            if value is not None:
+                self._remember(key, value)
+        if value is not None:
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+            return value
+
+        self.misses[kind] = self.misses.get(kind, 0) + 1
+        value = compute()
+        self._remember(key, value)
+        if self.cache_dir:
+            self._save(kind, key, value)
+        return value
+
+    def log_stats(self):
+        """
+        在日志中输出每个类别的命中和未命中次数。
+        """
+        for kind in sorted(set(self.hits) | set(self.misses)):
+            hits, misses = self.hits.get(kind, 0), self.misses.get(kind, 0)
+            logging.info(f"结果缓存[{kind}]: 命中 {hits} 次，未命中 {misses} 次，"
+                         f"命中率 {hits / (hits + misses):.1%}。")
+
+    def merge_stats(self, hits, misses):
+        """
+        累加其他缓存（如工作进程中的缓存）的命中和未命中次数，用于汇总输出。
+
+        参数:
+            hits (dict): 每个类别的命中次数。
+            misses (dict): 每个类别的未命中次数。
+        """
+        for kind, count in hits.items():
+            self.hits[kind] = self.hits.get(kind, 0) + count
+        for kind, count in misses.items():
+            self.misses[kind] = self.misses.get(kind, 0) + count
+
+    def _remember(self, key, value):
+        """
+        将结果放入内存，超过上限时淘汰最久未使用的结果。
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, kind, key):
+        """
+        获取结果在磁盘上的路径，按哈希的前两位分目录存放。
+        """
+        return os.path.join(self.cache_dir, kind, key[:2], f"{key}.json.gz")
+
+    def _load(self, kind, key):
+        """
+        从磁盘读取结果，文件不存在或已损坏时返回None。
+        """
+        path = self._path(kind, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, EOFError, ValueError) as e:
+            logging.warning(f"读取结果缓存 {path} 失败: {e}")
+            return None
+
+    def _save(self, kind, key, value):
+        """
+        将结果写入磁盘。
+        """
+        path = self._path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再替换，保证并发写入同一结果时文件始终完整
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
@@ -0,0 +1,162 @@
+# modules/result_store.py
+# 功能：将每行的处理结果实时提交到本地SQLite数据库（WAL模式），支持崩溃后断点续跑和导出。
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from modules.data_handler import TEXT_HASH_COLUMN, text_hash
+
+# 结果库中保存的结果列
+RESULT_COLUMNS = ['markdown_ppt', 'theme_id', 'ppt_download_link', 'ppt_xml']
+
+
+class ResultStore:
+    """
+    结果存储类，每处理完一行就在独立事务中提交该行结果，进程崩溃时已提交的行不会丢失。
+    每个结果记录计算时所用text的哈希，text变化后不会再写回旧的结果。
+
+    属性:
+        db_path (str): SQLite数据库文件的路径。
+    """
+
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    def __init__(self, db_path):
+        """
+        初始化ResultStore类，打开（或创建）数据库并启用WAL模式。
+
+        参数:
+            db_path (str): SQLite数据库文件的路径。
+        """
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        # 多个工作线程共享同一个连接，写入时由锁保证串行
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "row_id TEXT PRIMARY KEY, "
+            "row_index INTEGER, "
+            "markdown_ppt TEXT, "
+            "theme_id TEXT, "
+            "ppt_download_link TEXT, "
+            "ppt_xml TEXT, "
+            "status TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, "
+            "text_sha1 TEXT)"
+        )
+        # 旧的结果库没有text_sha1列，补充该列（旧结果的哈希为NULL）
+        columns = {name for _, name, *_ in self._conn.execute("PRAGMA table_info(results)")}
+        if 'text_sha1' not in columns:
+            self._conn.execute("ALTER TABLE results ADD COLUMN text_sha1 TEXT")
+        self._conn.commit()
+        logging.info(f"打开结果库: {db_path}")
+
+    def save(self, row_index, row_id, markdown_ppt, theme_id, ppt_download_link, ppt_xml, status, text=None):
+        """
+        提交一行的处理结果，已存在的同id结果会被覆盖。
+
+        参数:
+            row_index (int): 行在输入文件中的位置（0-based）。
+            row_id: 行的id列的值。
+            markdown_ppt (str or None): 提取的Markdown内容。
+            theme_id (str or None): 生成PPT使用的主题id。
+            ppt_download_link (str or None): PPT下载链接。
+            ppt_xml (str or None): PPT转换得到的XML。
+            status (str): 处理状态，STATUS_DONE或STATUS_FAILED。
+            text: 计算结果时该行text列的值，保存其哈希。
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results "
+                "(row_id, row_index, markdown_ppt, theme_id, ppt_download_link, ppt_xml, status, updated_at, "
+                "text_sha1) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(row_id), int(row_index), markdown_ppt, theme_id, ppt_download_link, ppt_xml, status,
+                 time.time(), text_hash(text))
+            )
+
+    def invalidate(self, row_ids):
+        """
+        删除指定行的结果，用于text或流水线配置发生变化的行。
+
+        参数:
+            row_ids (iterable): 行的id列的值。
+
+        返回:
+            int: 删除的结果数。
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.executemany("DELETE FROM results WHERE row_id = ?",
+                                            [(str(row_id),) for row_id in row_ids])
+            deleted = cursor.rowcount
+        if deleted:
+            logging.info(f"删除结果库中 {deleted} 行已失效的结果。")
+        return deleted
+
+    def completed_ids(self):
+        """
+        获取已成功处理的行id及计算结果时所用text的哈希。调用方应只跳过哈希与当前text的哈希相同的行，
+        哈希为None（旧结果库）的行无法判断，视为已处理。
+
+        返回:
+            dict: 状态为STATUS_DONE的行id到text哈希（str或None）的映射。
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT row_id, text_sha1 FROM results WHERE status = ?", (self.STATUS_DONE,))
+            return {row_id: stored_hash for row_id, stored_hash in rows}
+
+    def apply_to(self, df):
+        """
+        按id列将结果库中的结果写回DataFrame的结果列。只写回计算时的text哈希与该行当前text哈希相同的结果，
+        当前哈希优先取df的TEXT_HASH_COLUMN列（Excel输出中的text可能被截断），没有该列时由text列计算；
+        旧结果库中没有记录哈希的结果照常写回。
+
+        参数:
+            df (pandas.DataFrame): 包含'id'和'text'列的输出DataFrame，会被原地修改。
+
+        返回:
+            int: 写回的行数。
+        """
+        for column in RESULT_COLUMNS:
+            if column not in df.columns:
+                df[column] = None
+
+        if TEXT_HASH_COLUMN in df.columns:
+            hashes = df[TEXT_HASH_COLUMN]
+        else:
+            hashes = df['text'].map(text_hash)
+        positions = {str(row_id): (idx, current_hash)
+                     for idx, row_id, current_hash in zip(df.index, df['id'], hashes)}
+        applied = 0
+        stale = 0
+        with self._lock:
+            rows = self._conn.execute(f"SELECT row_id, text_sha1, {', '.join(RESULT_COLUMNS)} FROM results")
+            for row_id, stored_hash, *values in rows:
+                position = positions.get(row_id)
+                if position is None:
+                    continue
+                idx, current_hash = position
+                if stored_hash is not None and stored_hash != current_hash:
+                    stale += 1
+                    continue
+                for column, value in zip(RESULT_COLUMNS, values):
+                    df.at[idx, column] = value
+                applied += 1
+        logging.info(f"从结果库写回 {applied} 行结果，跳过 {stale} 行text已变化的结果。")
+        return applied
+
+    def close(self):
+        """
+        关闭数据库连接。
+        """
+        with self._lock:
+            self._conn.close()
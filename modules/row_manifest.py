@@ -0,0 +1,121 @@
+# modules/row_manifest.py
+# 功能：记录每行id对应的text与流水线配置的哈希，重新运行时只处理哈希发生变化的行。
+
+import os
+import json
+import hashlib
+import logging
+
+
+class RowManifest:
+    """
+    行哈希清单类。每行的哈希由流水线配置的指纹和该行的text共同计算，
+    text或配置（正则模式、主题策略、渲染方式等）任一变化都会使哈希改变。
+
+    属性:
+        path (str): 清单文件的路径。
+        config_fingerprint (str): 流水线配置的指纹。
+    """
+
+    def __init__(self, path, pipeline_config):
+        """
+        初始化RowManifest类并加载已有的清单。
+
+        参数:
+            path (str): 清单文件的路径。
+            pipeline_config (dict): 影响处理结果的流水线配置，需可序列化为JSON。
+        """
+        self.path = path
+        self.config_fingerprint = self.fingerprint(pipeline_config)
+        self._hashes = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._hashes = json.load(f).get('rows', {})
+            logging.info(f"加载行哈希清单: {path}，共 {len(self._hashes)} 行。")
+
+    @staticmethod
+    def fingerprint(pipeline_config):
+        """
+        计算流水线配置的指纹。
+
+        参数:
+            pipeline_config (dict): 流水线配置。
+
+        返回:
+            str: 配置的SHA-1指纹。
+        """
+        data = json.dumps(pipeline_config, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def row_hash(self, text):
+        """
+        计算一行的哈希。
+
+        参数:
+            text: 行的text列的值。
+
+        返回:
+            str: 行哈希。
+        """
+        sha1 = hashlib.sha1(self.config_fingerprint.encode('utf-8'))
+        sha1.update(b'\0')
+        sha1.update(str(text).encode('utf-8'))
+        return sha1.hexdigest()
+
+    def is_changed(self, row_id, text):
+        """
+        判断一行自上次记录以来是否发生变化（包括新增的行）。
+
+        参数:
+            row_id: 行的id列的值。
+            text: 行的text列的值。
+
+        返回:
+            bool: 是否需要重新处理。
+        """
+        return self._hashes.get(str(row_id)) != self.row_hash(text)
+
+    def changed_rows(self, df, include_new=True):
+        """
+        找出DataFrame中发生变化的行。
+
+        参数:
+            df (pandas.DataFrame): 包含'id'和'text'列的DataFrame。
+            include_new (bool): 是否包含清单中没有记录的行。
+
+        返回:
+            list: 发生变化的行的索引。
+        """
+        changed_rows = []
+        for idx, row_id, text in zip(df.index, df['id'], df['text']):
+            recorded = self._hashes.get(str(row_id))
+            if recorded is None:
+                if include_new:
+                    changed_rows.append(idx)
+            elif recorded != self.row_hash(text):
+                changed_rows.append(idx)
+        return changed_rows
+
+    def update(self, row_id, text):
+        """
+        记录一行当前的哈希，表示该行已按当前配置处理完成。
+
+        参数:
+            row_id: 行的id列的值。
+            text: 行的text列的值。
+        """
+        self._hashes[str(row_id)] = self.row_hash(text)
+
+    def save(self):
+        """
+        将清单写入文件。
+        """
+        manifest_dir = os.path.dirname(self.path)
+        if manifest_dir and not os.path.exists(manifest_dir):
+            os.makedirs(manifest_dir)
+        # 先写临时文件再替换，避免中断时留下不完整的清单
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'config': self.config_fingerprint, 'rows': self._hashes}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        logging.info(f"保存行哈希清单: {self.path}，共 {len(self._hashes)} 行。")
@@ -0,0 +1,88 @@
+# modules/xml_backend.py
+# 功能：选择XMLProcessor解析非固定格式XML时使用的解析后端。默认使用标准库ElementTree，可以切换为lxml的C解析器。
+# 序列化不经过后端：转换器和打乱的输出都由字符串直接拼接，lxml的pretty_print无法逐字节还原原来的格式。
+
+import logging
+import threading
+import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # lxml是可选依赖
+    lxml_etree = None
+
+# 可选的解析后端
+XML_BACKENDS = ('lxml', 'stdlib')
+
+# 实测lxml的解析并不比标准库快，逐个访问其元素的开销还更大（见benchmarks/bench_xml_backend.py），
+# 因此即使安装了lxml也默认使用标准库
+_backend = 'stdlib'
+# lxml解析器不能在线程间共享，每个线程各自创建
+_local = threading.local()
+
+
+def get_backend():
+    """
+    获取当前使用的解析后端。
+
+    返回:
+        str: 'lxml'或'stdlib'。
+    """
+    return _backend
+
+
+def set_backend(name):
+    """
+    设置解析后端。
+
+    参数:
+        name (str): 'lxml'或'stdlib'。
+
+    异常:
+        ValueError: 如果name不是可选的后端。
+        ImportError: 如果选择了lxml但未安装。
+    """
+    global _backend
+    if name not in XML_BACKENDS:
+        raise ValueError(f"不支持的XML解析后端: {name}，可选: {', '.join(XML_BACKENDS)}")
+    if name == 'lxml' and lxml_etree is None:
+        raise ImportError("使用lxml解析后端需要安装lxml。")
+    _backend = name
+    logging.debug(f"XML解析后端: {name}")
+
+
+def parse_xml(xml_str):
+    """
+    解析XML字符串，返回根元素。返回的元素支持ElementTree的attrib、text、tail、findall和迭代子元素等接口。
+
+    使用lxml时不保留注释和处理指令、不限制文本长度，与ElementTree的解析结果一致；
+    lxml解析失败，或文档带有XML声明（可能声明了其他编码）或DOCTYPE时改用ElementTree，由它给出与原来相同的结果或错误。
+
+    参数:
+        xml_str (str): XML字符串。
+
+    返回:
+        根元素（xml.etree.ElementTree.Element或lxml.etree._Element）。
+
+    异常:
+        xml.etree.ElementTree.ParseError: 如果XML格式不正确。
+    """
+    if _backend == 'lxml' and not xml_str.startswith('<?xml') and '<!DOCTYPE' not in xml_str:
+        try:
+            return lxml_etree.fromstring(xml_str.encode('utf-8'), _get_lxml_parser())
+        except (lxml_etree.XMLSyntaxError, ValueError):
+            # 包括无法编码为UTF-8的字符串
+            pass
+    return ET.fromstring(xml_str)
+
+
+def _get_lxml_parser():
+    """
+    获取当前线程的lxml解析器，首次调用时创建。
+    """
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        parser = lxml_etree.XMLParser(remove_comments=True, remove_pis=True, resolve_entities=False,
+                                      no_network=True, huge_tree=True)
+        _local.parser = parser
+    return parser
@@ -2,9 +2,43 @@
 # 功能：打乱每个<slide>内的<p>标签顺序，并重新分配id。
 
 import xml.etree.ElementTree as ET
+import re
 import random
+import hashlib
 import logging
+import numpy as np
 from xml.dom import minidom
+from modules.xml_backend import parse_xml
+from modules.markdown_to_xml import render_paragraph, render_slide, INVALID_XML_CHARS, ESCAPE_TEXT_QUOTES
+
+# 转换器输出的固定格式中slide的开始标签、<p>元素（含行尾换行符）和slide的结束标签
+SLIDE_OPEN = re.compile(r'<slide id="\d+">\n')
+PARAGRAPH = re.compile(r'<p>[^<]+</p>\n|<p/>\n')
+SLIDE_CLOSE = '</slide>\n'
+# <p>文本中不符合固定格式的内容：转换器不会输出的实体引用、未转义的字符、XML不允许的字符
+NON_CANONICAL_TEXT = re.compile('|'.join([
+    '&(?!(?:amp|lt|gt|quot);)' if ESCAPE_TEXT_QUOTES else '&(?!(?:amp|lt|gt);)',
+    '["\r>]' if ESCAPE_TEXT_QUOTES else '[\r>]',
+    INVALID_XML_CHARS.pattern,
+]))
+# <p>文本中的空行（美化输出时会被移除）
+BLANK_LINE = re.compile(r'\n\s*\n')
+
+
+def variant_seed(seed):
+    """
+    将行id等种子转换为numpy随机数生成器的种子。种子先转换为字符串再计算sha256，
+    因此同一行id无论读取为整数还是字符串、在哪台机器上处理，得到的打乱结果都相同。
+
+    参数:
+        seed: 种子，通常为行id；为None时不固定种子。
+
+    返回:
+        int or None: numpy随机数生成器的种子。
+    """
+    if seed is None:
+        return None
+    return int.from_bytes(hashlib.sha256(str(seed).encode('utf-8')).digest(), 'big')
 
 
 class XMLProcessor:
@@ -13,12 +47,16 @@ class XMLProcessor:
 
     方法:
         shuffle_xml(xml_str): 打乱XML中的p标签顺序。
+        shuffle_slides(slides): 打乱内存中slide结构的p顺序并生成XML。
+        shuffle_variants(xml_str, k, seed): 按种子生成k个可复现的打乱结果。
+        shuffle_outline(outline): 根据Markdown大纲生成打乱后的XML。
     """
 
     @staticmethod
     def shuffle_xml(xml_str):
         """
         按照指定规则打乱XML中的<p>标签顺序，并重新分配slide的id。
+        解析出每个slide的<p>文本后交给shuffle_slides处理。
 
         参数:
             xml_str (str): 原始的XML字符串。
@@ -27,13 +65,205 @@ class XMLProcessor:
             str: 打乱后的XML字符串。
         """
         logging.debug("开始打乱XML中的<p>标签顺序。")
-        slides = ET.Element('slides')  # 创建一个根元素
+        # 转换器输出的固定格式直接按<p>的位置拼接，无需解析
+        spans = XMLProcessor.index_paragraphs(xml_str)
+        if spans is not None:
+            return XMLProcessor._shuffle_paragraphs(
+                [[xml_str[start:end] for start, end in slide_spans] for slide_spans in spans])
+
         try:
-            parsed_xml = ET.fromstring(f"{xml_str}")
+            parsed_xml = parse_xml(f"{xml_str}")
         except ET.ParseError as e:
             logging.error(f"解析XML时出错: {e}")
             return ""
 
+        slides = XMLProcessor._parse_slides(parsed_xml)
+        if slides is None:
+            # <p>带有属性、子元素或尾随文本时无法只用文本表示，沿用逐元素重建的方式
+            return XMLProcessor._shuffle_elements(xml_str)
+        return XMLProcessor.shuffle_slides(slides)
+
+    @staticmethod
+    def shuffle_slides(slides):
+        """
+        在内存中的slide结构上打乱每个slide内<p>的顺序，重新从1开始分配slide的id，并一次性生成XML。
+
+        参数:
+            slides (list of tuple): 每个slide的(slide_id, 内容列表)，例如MarkdownOutline.slides的返回值，不会被修改。
+
+        返回:
+            str: 打乱后的XML字符串。
+        """
+        return XMLProcessor._shuffle_paragraphs(
+            [[render_paragraph(content) for content in contents] for _, contents in slides])
+
+    @staticmethod
+    def shuffle_variants(xml_str, k, seed=None):
+        """
+        只解析一次XML，生成k个打乱结果，用于数据增强。使用由seed确定的独立随机数生成器，
+        不影响也不依赖全局的random状态，相同的XML和seed总是得到相同的结果。
+
+        参数:
+            xml_str (str): 原始的XML字符串。
+            k (int): 生成的打乱结果个数。
+            seed: 种子，通常为行id；为None时每次结果不同。
+
+        返回:
+            list of str: k个打乱后的XML字符串；XML解析失败时返回空列表。
+        """
+        spans = XMLProcessor.index_paragraphs(xml_str)
+        if spans is not None:
+            return XMLProcessor._paragraph_variants(
+                [[xml_str[start:end] for start, end in slide_spans] for slide_spans in spans], k, seed)
+
+        try:
+            parsed_xml = parse_xml(f"{xml_str}")
+        except ET.ParseError as e:
+            logging.error(f"解析XML时出错: {e}")
+            return []
+        slides = XMLProcessor._parse_slides(parsed_xml)
+        if slides is None:
+            logging.error("XML中的<p>带有属性、子元素或尾随文本，无法生成打乱结果。")
+            return []
+        return XMLProcessor.shuffle_slide_variants(slides, k, seed)
+
+    @staticmethod
+    def shuffle_slide_variants(slides, k, seed=None):
+        """
+        在内存中的slide结构上生成k个打乱结果。每个slide的k个排列由一次numpy调用生成
+        （对k行随机数按行argsort），每个<p>只转义一次。
+
+        参数:
+            slides (list of tuple): 每个slide的(slide_id, 内容列表)，例如MarkdownOutline.slides的返回值。
+            k (int): 生成的打乱结果个数。
+            seed: 种子，通常为行id；为None时每次结果不同。
+
+        返回:
+            list of str: k个打乱后的XML字符串，slide的id重新从1开始分配。
+        """
+        return XMLProcessor._paragraph_variants(
+            [[render_paragraph(content) for content in contents] for _, contents in slides], k, seed)
+
+    @staticmethod
+    def index_paragraphs(xml_str):
+        """
+        扫描一次转换器输出的固定格式XML，记录每个slide中各<p>元素的(起始, 结束)位置。
+        格式为"<slides>"、每个slide的'<slide id="N">'、每个<p>、"</slide>"和"</slides>"各占一行，
+        且<p>文本只含有转换器会输出的转义。
+
+        参数:
+            xml_str (str): XML字符串。
+
+        返回:
+            list of list or None: 每个slide中各<p>元素在xml_str中的(起始, 结束)位置；
+            不符合固定格式时返回None，此时应使用XML解析器处理。
+        """
+        if not isinstance(xml_str, str):
+            return None
+        if xml_str in ('<slides/>', '<slides>\n</slides>'):
+            return []
+        if not (xml_str.startswith('<slides>\n') and xml_str.endswith('\n</slides>')):
+            return None
+
+        spans = []
+        pos = len('<slides>\n')
+        end = len(xml_str) - len('</slides>')
+        while pos < end:
+            slide_match = SLIDE_OPEN.match(xml_str, pos)
+            if slide_match is None:
+                return None
+            pos = slide_match.end()
+            slide_spans = []
+            while True:
+                paragraph_match = PARAGRAPH.match(xml_str, pos)
+                if paragraph_match is None:
+                    break
+                start, stop = paragraph_match.start(), paragraph_match.end() - 1
+                # 只检查<p>和</p>之间的文本
+                text_start, text_stop = start + len('<p>'), stop - len('</p>')
+                if (NON_CANONICAL_TEXT.search(xml_str, text_start, text_stop)
+                        or BLANK_LINE.search(xml_str, text_start, text_stop)):
+                    return None
+                slide_spans.append((start, stop))
+                pos = paragraph_match.end()
+            if not slide_spans or not xml_str.startswith(SLIDE_CLOSE, pos):
+                return None
+            pos += len(SLIDE_CLOSE)
+            spans.append(slide_spans)
+        return spans if pos == end else None
+
+    @staticmethod
+    def _shuffle_paragraphs(paragraph_lists):
+        """
+        打乱每个slide中已生成的<p>元素，重新从1开始分配slide的id并拼接XML。
+        """
+        shuffled_slides = []
+        for idx, paragraphs in enumerate(paragraph_lists, start=1):
+            paragraphs = list(paragraphs)
+            random.shuffle(paragraphs)  # 随机打乱<p>标签
+            shuffled_slides.append(render_slide(idx, paragraphs))  # 重新赋予id
+        if not shuffled_slides:
+            # 没有slide时根元素不使用自闭合标签（与原来的输出保持一致）
+            return "<slides>\n</slides>"
+        logging.debug("成功打乱XML中的<p>标签顺序。")
+        return '\n'.join(['<slides>', *shuffled_slides, '</slides>'])
+
+    @staticmethod
+    def _paragraph_variants(paragraph_lists, k, seed):
+        """
+        用已生成的<p>元素生成k个打乱结果，见shuffle_slide_variants。
+        """
+        rng = np.random.default_rng(variant_seed(seed))
+        variants = [[] for _ in range(k)]
+        for idx, paragraphs in enumerate(paragraph_lists, start=1):
+            if len(paragraphs) < 2:
+                for variant in variants:
+                    variant.append(render_slide(idx, paragraphs))
+                continue
+            permutations = np.argsort(rng.random((k, len(paragraphs))), axis=1)
+            for variant, permutation in zip(variants, permutations.tolist()):
+                variant.append(render_slide(idx, [paragraphs[i] for i in permutation]))
+        return ['\n'.join(['<slides>', *variant, '</slides>']) for variant in variants]
+
+    @staticmethod
+    def shuffle_outline(outline):
+        """
+        直接根据已解析的Markdown大纲生成打乱后的XML，无需先转换为XML再解析。
+        在随机数状态相同时，结果与shuffle_xml(MarkdownToXMLConverter().convert_outline(outline))相同。
+
+        参数:
+            outline (MarkdownOutline): Markdown大纲。
+
+        返回:
+            str: 打乱后的XML字符串。
+        """
+        return XMLProcessor.shuffle_slides(outline.slides())
+
+    @staticmethod
+    def _parse_slides(parsed_xml):
+        """
+        从解析后的XML中取出每个slide的id和<p>文本。
+
+        返回:
+            list of tuple or None: 每个slide的(slide_id, 内容列表)；<p>带有属性、子元素或非空白的尾随文本时返回None。
+        """
+        slides = []
+        for slide_elem in parsed_xml:
+            contents = []
+            for p in slide_elem.findall('p'):
+                if p.attrib or len(p) or (p.tail and p.tail.strip()):
+                    return None
+                contents.append(p.text or '')
+            slides.append((slide_elem.attrib['id'], contents))
+        return slides
+
+    @staticmethod
+    def _shuffle_elements(xml_str):
+        """
+        逐个重建slide元素并打乱<p>，再经minidom美化（原来的实现，始终使用ElementTree）。
+        """
+        parsed_xml = ET.fromstring(f"{xml_str}")
+        slides = ET.Element('slides')  # 创建一个根元素
         for slide_elem in parsed_xml:
             slide = ET.Element('slide', id=slide_elem.attrib['id'])
             p_elements = list(slide_elem.findall('p'))
@@ -41,12 +271,10 @@ class XMLProcessor:
             for p in p_elements:
                 slide.append(p)
             slides.append(slide)
-            # logging.debug(f"打乱后的slide: {ET.tostring(slide, encoding='unicode')}")
 
         # 重新赋予id
         for idx, slide in enumerate(slides.findall('slide'), start=1):
             slide.set('id', str(idx))
-            # logging.debug(f"重新分配slide id: {slide.get('id')}")
 
         # 生成新的XML字符串
         new_xml = "\n".join([ET.tostring(slide, encoding='unicode') for slide in slides.findall('slide')])
@@ -0,0 +1,80 @@
+# tests/test_data_handler.py
+# 功能：验证输入文件的列式缓存和输出文件的按列读取。
+
+import os
+
+import pandas as pd
+import pytest
+
+from modules import data_handler
+from modules.data_handler import DataHandler, TEXT_HASH_COLUMN
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def mixed_id_input(tmp_path):
+    # Excel中的id列常常混合整数和字符串
+    path = str(tmp_path / 'input.xlsx')
+    pd.DataFrame({'id': [1, 'a2', 3, 'b4', 5.5], 'text': ['t1', 't2', None, 't4', 't5']}).to_excel(path, index=False)
+    return path
+
+
+@pytest.fixture
+def count_reads(monkeypatch):
+    reads = []
+    read_table = DataHandler._read_table.__func__
+
+    def counting_read_table(cls, path, columns=None):
+        reads.append(os.path.basename(path))
+        return read_table(cls, path, columns)
+
+    monkeypatch.setattr(DataHandler, '_read_table', classmethod(counting_read_table))
+    return reads
+
+
+def test_input_cache_written_for_mixed_type_ids(tmp_path, mixed_id_input, count_reads):
+    handler = DataHandler(mixed_id_input, str(tmp_path / 'output.xlsx'))
+    df = handler.read_excel(build_cache=True)
+    assert os.path.exists(handler.input_cache_file)
+    assert handler._open_input_cache() is not None
+
+    assert handler.count_input_rows() == len(df)
+    cached = handler.read_excel_range(1, 4)
+    assert cached['id'].tolist() == ['a2', '3', 'b4']
+    assert cached.at[1, 'text'] == 't2' and pd.isna(cached.at[2, 'text']) and cached.at[3, 'text'] == 't4'
+    assert cached.index.tolist() == [1, 2, 3]
+    # 之后的读取都来自缓存，输入文件只解析一次
+    assert count_reads == ['input.xlsx']
+
+
+def test_input_cache_keeps_numeric_ids(tmp_path):
+    path = str(tmp_path / 'input.xlsx')
+    pd.DataFrame({'id': [1, 2, 3], 'text': ['a', 'b', 'c']}).to_excel(path, index=False)
+    handler = DataHandler(path, str(tmp_path / 'output.xlsx'))
+    handler.read_excel(build_cache=True)
+    assert handler.read_excel_range()['id'].tolist() == [1, 2, 3]
+
+
+@pytest.mark.parametrize('extension', ['.xlsx', '.jsonl', '.parquet'])
+def test_read_output_columns_reads_header_only(tmp_path, extension):
+    output_file = str(tmp_path / f'output{extension}')
+    handler = DataHandler(str(tmp_path / 'input.xlsx'), output_file)
+    assert handler.read_output_columns() is None
+
+    columns = ['id', 'text', 'extra', 'ppt_xml', TEXT_HASH_COLUMN]
+    handler.write_excel(pd.DataFrame([['1', 'a', 'x', '<x/>', 'h']], columns=columns))
+    assert handler.read_output_columns() == columns
+
+
+def test_merge_output_without_previous_text(tmp_path):
+    handler = DataHandler(str(tmp_path / 'input.xlsx'), str(tmp_path / 'output.xlsx'))
+    input_df = pd.DataFrame({'id': ['1', '2'], 'text': ['a', 'b2']})
+    previous_df = pd.DataFrame({'id': ['2', '1'], 'extra': ['y', 'x'], 'ppt_xml': ['<b/>', '<a/>'],
+                                TEXT_HASH_COLUMN: [data_handler.text_hash('b'), data_handler.text_hash('a')]})
+    merged, new_rows, changed_rows = handler.merge_output(input_df, previous_df, ['ppt_xml'])
+    assert list(merged.columns[:2]) == ['id', 'text']
+    assert merged['text'].tolist() == ['a', 'b2']
+    assert merged['extra'].tolist() == ['x', 'y']
+    assert merged['ppt_xml'].tolist() == ['<a/>', None]
+    assert (new_rows, changed_rows) == ([], [1])
@@ -0,0 +1,64 @@
+# tests/test_kdc_media.py
+# 功能：验证Presentation的media(id)索引在原始medias数组变化后重新建立，以及媒体在首次读取时才下载。
+
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('streamlit')
+
+from modules import kdc2xml
+from modules.kdc2xml import Media, Presentation
+
+
+def make_presentation(*ids):
+    return Presentation({'medias': [{'id': i, 'mime_type': 'image/png', 'url': '', 'data': ''} for i in ids]})
+
+
+def test_media_lookup():
+    pres = make_presentation('a', 'b', 'a')
+    assert pres.media('a') is pres.medias[0]
+    with pytest.raises(KeyError):
+        pres.media('c')
+
+
+def test_media_index_follows_in_place_replacement():
+    pres = make_presentation('a', 'b')
+    assert pres.media('b').id == 'b'
+    pres['medias'][1] = {'id': 'c', 'mime_type': 'image/png', 'url': '', 'data': ''}
+    assert [m.id for m in pres.medias] == ['a', 'c']
+    assert pres.media('c').id == 'c'
+    with pytest.raises(KeyError):
+        pres.media('b')
+
+
+def test_media_index_follows_list_changes():
+    pres = make_presentation('a')
+    assert pres.media('a').id == 'a'
+    pres['medias'].append({'id': 'b', 'mime_type': 'image/png', 'url': '', 'data': ''})
+    assert pres.media('b').id == 'b'
+    pres._data['medias'] = [{'id': 'x', 'mime_type': 'image/png', 'url': '', 'data': ''}]
+    assert pres.media('x').id == 'x'
+    with pytest.raises(KeyError):
+        pres.media('a')
+
+
+def test_media_downloaded_on_first_read(tmp_path, monkeypatch):
+    downloads = []
+
+    def fake_download(url, media_dir):
+        downloads.append(url)
+        path = f'{media_dir}/blob'
+        with open(path, 'wb') as f:
+            f.write(b'content')
+        return path
+
+    monkeypatch.setattr(kdc2xml, '_download_media', fake_download)
+    raw = {'id': 'a', 'url': '', 'download_url': 'http://media/a', 'media_dir': str(tmp_path)}
+    media = Media(raw)
+    assert media.has_content and media.path is None and downloads == []
+
+    assert media.read_bytes() == b'content'
+    media.save(str(tmp_path / 'copy'))
+    assert Media(raw).read_bytes() == b'content'
+    assert (tmp_path / 'copy').read_bytes() == b'content'
+    assert downloads == ['http://media/a']
@@ -0,0 +1,103 @@
+# tests/test_markdown_to_xml.py
+# 功能：验证直接拼接的XML与原来的ElementTree+minidom实现逐字节一致。
+
+import xml.etree.ElementTree as ET
+from xml.dom import minidom
+
+import pytest
+
+from modules.markdown_outline import MarkdownOutline
+from modules.markdown_to_xml import MarkdownToXMLConverter
+
+
+def reference_convert(markdown):
+    """
+    原来的MarkdownToXMLConverter.convert（去掉日志），作为对照。
+    """
+    root = ET.Element('slides')
+    slide_id = 1
+    current_slide = None
+
+    def create_slide(content):
+        nonlocal slide_id
+        slide = ET.Element('slide', id=str(slide_id))
+        slide_id += 1
+        ET.SubElement(slide, 'p').text = content
+        return slide
+
+    for line in markdown.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('# '):
+            current_slide = create_slide(line[2:].strip())
+            root.append(current_slide)
+        elif line.startswith('## '):
+            current_slide = create_slide(line[3:].strip())
+            root.append(current_slide)
+        elif line.startswith('### '):
+            current_slide = create_slide(line[4:].strip())
+            root.append(current_slide)
+        elif line.startswith('#### '):
+            if current_slide is not None:
+                ET.SubElement(current_slide, 'p').text = line[5:].strip()
+        else:
+            if line.startswith('* '):
+                line = line[2:].strip()
+            if current_slide is None:
+                current_slide = create_slide(line)
+            else:
+                ET.SubElement(current_slide, 'p').text = line
+
+    rough_string = ET.tostring(root, 'utf-8')
+    pretty_xml = minidom.parseString(rough_string).toprettyxml(indent="")
+    return '\n'.join([line for line in pretty_xml.split('\n') if line.strip() and not line.startswith('<?xml')])
+
+
+MARKDOWNS = {
+    'empty': '',
+    'blank_lines': '\n\n   \n',
+    'ampersand': '# A & B\n* 1 && 2',
+    'angle_brackets': '# <title>\n* a < b > c\n#### <p>x</p>',
+    'quotes': '# "quoted"\n* \'single\' and "double"',
+    'entities': '# &amp; &lt; &#38;\n* ]]> <![CDATA[x]]>',
+    'carriage_return': '# a\rb\n* c\r\n* \rd\r\r e\r',
+    'multi_line': '# 标题\n## 第二页\n### 第三页\n#### 小标题\n* 列表项\n正文\n\n# 第四页\n正文',
+    'body_before_heading': '第一行正文\n第二行正文\n# 标题',
+    'level4_without_slide': '#### 没有slide\n* 也没有',
+    'deep_heading': '##### 五级标题\n#没有空格\n# \n*',
+    'unicode': '# “客户第一，质量为先”\n* 😀  非断行空格 ',
+    'line_separators': '# a\u2028b\n* c\x85d\u2029e',
+}
+
+
+@pytest.mark.parametrize('markdown', MARKDOWNS.values(), ids=MARKDOWNS.keys())
+def test_convert_matches_reference(markdown):
+    assert MarkdownToXMLConverter().convert(markdown) == reference_convert(markdown)
+
+
+@pytest.mark.parametrize('markdown', MARKDOWNS.values(), ids=MARKDOWNS.keys())
+def test_serialize_slides_matches_minidom(markdown):
+    slides = MarkdownOutline(markdown).slides()
+    assert MarkdownToXMLConverter.serialize_slides(slides) == MarkdownToXMLConverter._serialize_minidom(slides)
+
+
+@pytest.mark.parametrize('markdown', MARKDOWNS.values(), ids=MARKDOWNS.keys())
+def test_convert_iter_matches_convert(markdown):
+    converter = MarkdownToXMLConverter()
+    fragments = list(converter.convert_iter(markdown))
+    expected = converter.convert(markdown)
+    if fragments:
+        assert '\n'.join(['<slides>', *fragments, '</slides>']) == expected
+    else:
+        assert expected == '<slides/>'
+
+
+@pytest.mark.parametrize('markdown', ['# a\x00b', '# ok\n* \x08', '# t\n* a\x1fb', '# a\x1cb', '# \ufffe'])
+def test_invalid_characters_raise_like_reference(markdown):
+    with pytest.raises(Exception) as expected:
+        reference_convert(markdown)
+    with pytest.raises(expected.type):
+        MarkdownToXMLConverter().convert(markdown)
+    with pytest.raises(ValueError):
+        list(MarkdownToXMLConverter().convert_iter(markdown))
@@ -0,0 +1,47 @@
+# tests/test_result_store.py
+# 功能：验证结果库按text哈希判断结果是否仍然有效。
+
+import sqlite3
+
+import pandas as pd
+
+from modules.data_handler import text_hash
+from modules.result_store import ResultStore
+
+
+def test_completed_ids_records_text_hash(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.db'))
+    store.save(0, 1, 'md', 't', 'link', '<x/>', ResultStore.STATUS_DONE, 'old text')
+    store.save(1, 'b', None, None, None, None, ResultStore.STATUS_FAILED, 'text')
+    assert store.completed_ids() == {'1': text_hash('old text')}
+    store.close()
+
+
+def test_legacy_results_have_no_hash(tmp_path):
+    db_path = str(tmp_path / 'results.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE results (row_id TEXT PRIMARY KEY, row_index INTEGER, markdown_ppt TEXT, "
+                 "theme_id TEXT, ppt_download_link TEXT, ppt_xml TEXT, status TEXT NOT NULL, updated_at REAL NOT NULL)")
+    conn.execute("INSERT INTO results VALUES ('1', 0, 'md', 't', 'link', '<x/>', 'done', 0)")
+    conn.commit()
+    conn.close()
+
+    store = ResultStore(db_path)
+    assert store.completed_ids() == {'1': None}
+    df = pd.DataFrame({'id': [1], 'text': ['any text']})
+    assert store.apply_to(df) == 1
+    assert df.at[0, 'ppt_xml'] == '<x/>'
+    store.close()
+
+
+def test_apply_to_skips_results_for_changed_text(tmp_path):
+    store = ResultStore(str(tmp_path / 'results.db'))
+    store.save(0, 1, 'md1', 't', 'link1', '<a/>', ResultStore.STATUS_DONE, 'a')
+    store.save(1, 2, 'md2', 't', 'link2', '<b/>', ResultStore.STATUS_DONE, 'b')
+    df = pd.DataFrame({'id': [1, 2], 'text': ['a', 'b changed']})
+    assert store.apply_to(df) == 1
+    assert df['ppt_xml'].tolist() == ['<a/>', None]
+
+    assert store.invalidate([1]) == 1
+    assert store.completed_ids() == {'2': text_hash('b')}
+    store.close()
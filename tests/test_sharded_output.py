@@ -0,0 +1,47 @@
+# tests/test_sharded_output.py
+# 功能：验证输出分片的清单只包含本次运行写出的分片。
+
+import os
+
+import pandas as pd
+
+from modules.data_handler import DataHandler
+
+
+def make_rows(start, count):
+    return pd.DataFrame({'id': [str(i) for i in range(start, start + count)],
+                         'text': [f't{i}' for i in range(start, start + count)]})
+
+
+def write(tmp_path, df, part=None, run=None, shard_rows=2):
+    handler = DataHandler(str(tmp_path / 'input.jsonl'), str(tmp_path / 'output.jsonl'),
+                          shard_rows=shard_rows, shard_part=part, shard_run=run)
+    handler.write_excel(df)
+    return handler
+
+
+def test_rerun_with_fewer_shards_drops_old_shards(tmp_path):
+    write(tmp_path, make_rows(0, 6))
+    handler = write(tmp_path, make_rows(100, 3))
+    assert handler.read_output_excel()['id'].tolist() == ['100', '101', '102']
+    assert sorted(os.listdir(tmp_path)) == ['output-00000.jsonl', 'output-00001.jsonl', 'output.manifest.json']
+
+
+def test_rerun_with_fewer_writers_ignores_stale_parts(tmp_path):
+    for part in ('w0', 'w1', 'w2'):
+        write(tmp_path, make_rows(int(part[1]) * 10, 3), part=part, run='run1')
+    for part in ('w0', 'w1'):
+        handler = write(tmp_path, make_rows(100 + int(part[1]) * 10, 1), part=part, run='run2')
+    assert sorted(handler.read_output_excel()['id']) == ['100', '110']
+
+
+def test_single_writer_replaces_parts_and_parts_replace_single_writer(tmp_path):
+    for part in ('w0', 'w1'):
+        write(tmp_path, make_rows(int(part[1]) * 10, 3), part=part, run='run1')
+    handler = write(tmp_path, make_rows(100, 3))
+    assert handler.read_output_excel()['id'].tolist() == ['100', '101', '102']
+    assert not any(name.startswith('output-w') for name in os.listdir(tmp_path))
+
+    handler = write(tmp_path, make_rows(200, 1), part='w0', run='run2')
+    assert handler.read_output_excel()['id'].tolist() == ['200']
+    assert 'output.manifest.json' not in os.listdir(tmp_path)
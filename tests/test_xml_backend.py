@@ -0,0 +1,68 @@
+# tests/test_xml_backend.py
+# 功能：验证lxml和标准库两种解析后端的打乱结果完全相同。
+
+import random
+
+import pytest
+
+from modules import xml_backend
+from modules.xml_processor import XMLProcessor
+
+pytest.importorskip('lxml')
+
+# 不符合转换器固定格式、需要经过XML解析器的输入
+XML_INPUTS = {
+    'indented': '<slides>\n  <slide id="1">\n    <p>a</p>\n    <p>b</p>\n    <p>c</p>\n  </slide>\n</slides>',
+    'single_line': '<slides><slide id="1"><p>a</p><p>b</p><p>c</p></slide><slide id="2"><p>d</p><p>e</p></slide></slides>',
+    'comments': '<slides><!-- 注释 --><slide id="1"><p>a</p><!-- x --><p>b</p><p>c</p></slide></slides>',
+    'processing_instructions': '<slides><?pi data?><slide id="1"><p>a</p><?x?><p>b</p><p>c</p></slide></slides>',
+    'paragraph_attributes': '<slides><slide id="1"><p c="1">a</p><p>b</p><p c="2">c</p></slide></slides>',
+    'paragraph_children': '<slides><slide id="1"><p>a<b>x</b>y</p><p>b</p>tail<p>c</p></slide></slides>',
+    'cdata': '<slides><slide id="1"><p><![CDATA[<a> & "b"]]></p><p>b</p><p>c</p></slide></slides>',
+    'entities': '<slides><slide id="1"><p>&#38; &#x3C; &gt; &quot;</p><p>\'</p><p>&amp;amp;</p></slide></slides>',
+    'xml_declaration': '<?xml version="1.0" encoding="UTF-8"?><slides><slide id="1"><p>a</p><p>b</p></slide></slides>',
+    'doctype': '<!DOCTYPE slides [<!ENTITY e "实体">]><slides><slide id="1"><p>&e;</p><p>b</p></slide></slides>',
+    'empty_elements': '<slides><slide id="1"/><slide id="2"><p/><p></p><p>x</p></slide></slides>',
+    'other_tags': '<root><slide id="9"><p>a</p><q>b</q><p>c</p></slide><other id="x"><p>d</p></other></root>',
+    'whitespace_text': '<slides><slide id="1"><p> a </p><p>\n\tb\r\n</p><p>c\r</p></slide></slides>',
+    'unicode': '<slides><slide id="1"><p>“客户第一”</p><p>😀</p><p> </p></slide></slides>',
+    'invalid': '<slides><slide id="1"><p>a</slide></slides>',
+    'undefined_entity': '<slides><slide id="1"><p>&nbsp;</p></slide></slides>',
+    'empty': '',
+}
+
+
+@pytest.fixture
+def restore_backend():
+    backend = xml_backend.get_backend()
+    yield
+    xml_backend.set_backend(backend)
+
+
+def run_with_backend(backend, func, *args):
+    xml_backend.set_backend(backend)
+    random.seed(1234)
+    return func(*args)
+
+
+@pytest.mark.parametrize('xml_str', XML_INPUTS.values(), ids=XML_INPUTS.keys())
+def test_shuffle_xml_same_for_both_backends(restore_backend, xml_str):
+    expected = run_with_backend('stdlib', XMLProcessor.shuffle_xml, xml_str)
+    assert run_with_backend('lxml', XMLProcessor.shuffle_xml, xml_str) == expected
+
+
+@pytest.mark.parametrize('xml_str', XML_INPUTS.values(), ids=XML_INPUTS.keys())
+def test_shuffle_variants_same_for_both_backends(restore_backend, xml_str):
+    expected = run_with_backend('stdlib', XMLProcessor.shuffle_variants, xml_str, 3, 7)
+    assert run_with_backend('lxml', XMLProcessor.shuffle_variants, xml_str, 3, 7) == expected
+
+
+@pytest.mark.parametrize('name', ['invalid', 'undefined_entity', 'empty'])
+def test_invalid_xml_returns_empty_string(restore_backend, name):
+    for backend in xml_backend.XML_BACKENDS:
+        assert run_with_backend(backend, XMLProcessor.shuffle_xml, XML_INPUTS[name]) == ""
+
+
+def test_set_backend_rejects_unknown_name(restore_backend):
+    with pytest.raises(ValueError):
+        xml_backend.set_backend('expat')
@@ -1,16 +1,30 @@
 # process_ppt.py
 import os
 import time
-from modules.data_handler import DataHandler
+from modules.data_handler import DataHandler, BLOB_THRESHOLD, TEXT_HASH_COLUMN, text_hash
 from modules.markdown_extractor import MarkdownExtractor
 from modules.markdown2ppt import gen_ppt
 from modules.kdc2xml import ppt_to_xml
+from modules.result_store import ResultStore, RESULT_COLUMNS
+from modules.row_manifest import RowManifest
 import concurrent.futures
 import logging
 from tqdm import tqdm
 import pandas as pd
 import configparser
 
+# 结果库的默认路径，可在config.ini的[gen_ppt]中通过result_db配置
+DEFAULT_RESULT_DB = 'output/results.db'
+# 行哈希清单的默认路径，可在config.ini的[gen_ppt]中通过manifest_file配置
+DEFAULT_MANIFEST_FILE = 'output/row_manifest.json'
+# 影响处理结果的流水线配置，任一项变化时所有行都会重新处理
+PIPELINE_CONFIG = {
+    'code_block_pattern': r'<\|code\|>{"function": "generate_ppt"}<\|endofblock\|>',
+    'execution_block_pattern': r'<\|execution\|>(.*?)<\|endofblock\|>',
+    'theme_policy': 'random',
+    'renderer': 'PPTHTMLRenderer',
+}
+
 
 def setup_logging(log_file):
     """
@@ -75,6 +89,24 @@ class CustomFormatter(logging.Formatter):
         return formatter.format(record)
 
 
+def create_data_handler(config):
+    """
+    根据config.ini中[gen_ppt]的配置创建DataHandler。
+
+    参数:
+        config (configparser.ConfigParser): 已加载的配置。
+
+    返回:
+        DataHandler: 数据处理对象。
+    """
+    section = config['gen_ppt']
+    return DataHandler(
+        section['input_file'], section['output_file'],
+        blob_dir=section.get('blob_dir', fallback=None),
+        blob_threshold=section.getint('blob_threshold', fallback=BLOB_THRESHOLD)
+    )
+
+
 def get_row_indices(total_rows, rows):
     """
     获取需要处理的行索引。
@@ -89,12 +121,15 @@ def get_row_indices(total_rows, rows):
     return [row - 1 for row in rows if 1 <= row <= total_rows]
 
 
-def process_ppt(rows_to_process=None):
+def process_ppt(rows_to_process=None, resume=True):
     """
     处理Excel表格中的指定行，生成PPT下载链接和XML格式的PPT。
 
+    每行处理完成后立即提交到结果库（SQLite），进程中断后重新运行时可跳过已成功处理的行。
+
     参数:
         rows_to_process (list of int): 需要处理的行号列表（1-based）。如果为None，则处理所有行。
+        resume (bool): 是否跳过结果库中已成功处理的行。
     """
     try:
         # 1. 加载配置文件
@@ -110,41 +145,82 @@ def process_ppt(rows_to_process=None):
         logging.debug("开始数据处理流程。")
 
         # 3. 初始化模块
-        data_handler = DataHandler(config['gen_ppt']['input_file'], config['gen_ppt']['output_file'])
+        data_handler = create_data_handler(config)
+        result_store = ResultStore(config['gen_ppt'].get('result_db', fallback=DEFAULT_RESULT_DB))
+        manifest = RowManifest(config['gen_ppt'].get('manifest_file', fallback=DEFAULT_MANIFEST_FILE),
+                               PIPELINE_CONFIG)
         extractor = MarkdownExtractor(
-            code_block_pattern=r'<\|code\|>{"function": "generate_ppt"}<\|endofblock\|>',
-            execution_block_pattern=r'<\|execution\|>(.*?)<\|endofblock\|>'
+            code_block_pattern=PIPELINE_CONFIG['code_block_pattern'],
+            execution_block_pattern=PIPELINE_CONFIG['execution_block_pattern']
         )
 
-        # 4. 读取Excel文件
-        input_df = data_handler.read_excel()
-
-        # 5. 读取输出文件（如果存在）
-        output_df = data_handler.read_output_excel()
-        if output_df is None:
-            # 如果输出文件不存在，创建一个新的DataFrame与input_df相同
-            output_df = input_df.copy()
-            # 初始化新列
-            output_df['markdown_ppt'] = None
-            output_df['theme_id'] = None
-            output_df['ppt_download_link'] = None
-            output_df['ppt_xml'] = None
+        # 4. 读取上次的输出文件（如果存在），按id与当前输入对齐。
+        # 上次输出记录了text的哈希时不读取text列，合并时text取自当前输入
+        previous_columns = data_handler.read_output_columns()
+        if previous_columns is None:
+            previous_df = None
+        else:
+            if TEXT_HASH_COLUMN in previous_columns:
+                previous_columns = [column for column in previous_columns if column != 'text']
+            previous_df = data_handler.read_output_excel(columns=previous_columns)
+        if previous_df is None:
+            # 如果输出文件不存在，读取完整的输入文件（同时生成列式缓存）并复制一份作为输出
+            output_df = data_handler.read_excel(build_cache=True).copy()
+            # 初始化新列，并记录text的哈希，下次运行时据此判断text是否变化
+            for column in RESULT_COLUMNS:
+                output_df[column] = None
+            output_df[TEXT_HASH_COLUMN] = output_df['text'].map(text_hash)
+            changed_rows = []
+            pending_rows = set(output_df.index)
             logging.info("创建新的输出DataFrame。")
         else:
-            # 确保输出DataFrame包含必要的新列
-            for column in ['markdown_ppt', 'ppt_download_link', 'ppt_xml', 'theme_id']:
-                if column not in output_df.columns:
-                    output_df[column] = None
-                    logging.debug(f"添加缺失的列: {column}")
-
-        # 6. 确定需要处理的行
-        total_rows = len(input_df)
+            # 从列式缓存读取全部id和text，按id合并，只调度新增、内容变化或尚无结果的行
+            output_df, new_rows, changed_rows = data_handler.merge_output(
+                data_handler.read_excel_range(), previous_df, RESULT_COLUMNS)
+            # 行哈希清单能发现流水线配置的变化，以及上次输出中没有保存text的情况
+            changed_rows = sorted(set(changed_rows) | set(manifest.changed_rows(output_df, include_new=False)))
+            # 删除变化行在结果库中的旧结果，避免它们在选中的行之外时被写回
+            result_store.invalidate(output_df.loc[changed_rows, 'id'])
+            unfinished_rows = output_df.index[output_df['ppt_xml'].isna()]
+            pending_rows = set(new_rows) | set(changed_rows) | set(unfinished_rows)
+
+        # 5. 确定需要处理的行
+        total_rows = data_handler.count_input_rows()
         if rows_to_process:
             selected_rows = get_row_indices(total_rows, rows_to_process)
-            logging.info(f"总共有 {total_rows} 行数据。将处理 {len(selected_rows)} 行数据。")
+            logging.info(f"总共有 {total_rows} 行数据。选中 {len(selected_rows)} 行数据。")
         else:
             selected_rows = list(range(total_rows))
-            logging.info(f"总共有 {total_rows} 行数据。将处理所有行。")
+            logging.info(f"总共有 {total_rows} 行数据。选中所有行。")
+        selected_rows = [idx for idx in selected_rows if idx in pending_rows]
+
+        # 6. 只读取需要处理的行范围（优先从列式缓存读取）
+        if selected_rows:
+            input_df = data_handler.read_excel_range(min(selected_rows), max(selected_rows) + 1)
+        else:
+            input_df = data_handler.read_excel_range(0, 0)
+
+        # 跳过结果库中已成功处理的行；结果计算后text又发生变化（例如中断后修改了输入）的行仍需处理
+        if resume:
+            completed_ids = result_store.completed_ids()
+            changed_rows = set(changed_rows)
+            remaining_rows = []
+            for idx in selected_rows:
+                row_id = input_df.at[idx, 'id']
+                text = input_df.at[idx, 'text']
+                # 旧结果库中没有记录哈希（None）的结果视为与当前text一致
+                if (idx in changed_rows or str(row_id) not in completed_ids
+                        or completed_ids[str(row_id)] not in (None, text_hash(text))):
+                    remaining_rows.append(idx)
+                else:
+                    manifest.update(row_id, text)
+            if len(remaining_rows) < len(selected_rows):
+                logging.info(f"跳过 {len(selected_rows) - len(remaining_rows)} 行已处理的数据。")
+            selected_rows = remaining_rows
+        logging.info(f"将处理 {len(selected_rows)} 行数据。")
+
+        # 一次提取所有待处理行的Markdown内容
+        markdowns = dict(zip(selected_rows, extractor.extract_many(input_df.loc[selected_rows, 'text'])))
 
         # 7. 处理指定行，添加进度条
         # for idx in tqdm(selected_rows, desc="Processing rows"):
@@ -175,12 +251,16 @@ def process_ppt(rows_to_process=None):
         #     output_df.at[idx, 'ppt_xml'] = ppt_xml
 
         def process_row(idx):
+            markdown, theme_id, download_link, ppt_xml = None, None, None, None
+            status = ResultStore.STATUS_FAILED
+            row_id, text = None, None
             try:
-                row = input_df.iloc[idx]
+                row = input_df.loc[idx]
+                row_id = row['id']
                 text = row['text']
                 logging.debug(f"处理第 {idx + 1} 行数据。")
-                # step 1: 提取目标Markdown内容
-                markdown = extractor.extract_markdown(text)
+                # step 1: 取出提前提取的目标Markdown内容
+                markdown = markdowns[idx]
                 if markdown is None:
                     logging.warning(f"第 {idx + 1} 行未找到目标Markdown内容。")
                 else:
@@ -203,6 +283,9 @@ def process_ppt(rows_to_process=None):
                                      show_xml=True if idx == 0 else False, keep_ppt=False)
                 if not ppt_xml:
                     logging.error(f"第 {idx + 1} 行转换 PPT 为 XML 失败。")
+                else:
+                    status = ResultStore.STATUS_DONE
+                    manifest.update(row_id, text)
                 output_df.at[idx, 'ppt_xml'] = ppt_xml
                 logging.error(f"第{idx + 1}行处理完成。")
 
@@ -210,6 +293,13 @@ def process_ppt(rows_to_process=None):
             except Exception as e:
                 logging.exception(f"处理第 {idx + 1} 行时发生异常: {e}")
 
+            # step 4: 立即提交该行结果，失败的行在下次运行时会重新处理
+            if row_id is not None:
+                try:
+                    result_store.save(idx, row_id, markdown, theme_id, download_link, ppt_xml, status, text)
+                except Exception as e:
+                    logging.exception(f"提交第 {idx + 1} 行结果时发生异常: {e}")
+
         def parallel_process(selected_rows, max_workers=8):
             with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
                 # 提交所有任务
@@ -220,8 +310,11 @@ def process_ppt(rows_to_process=None):
         # 7. 开始并行处理指定行
         parallel_process(selected_rows, max_workers=8)
 
-        # 8. 保存结果到输出Excel文件，并调整格式
+        # 8. 将结果库中的结果（包括之前运行提交的结果）写回，保存到输出Excel文件
+        result_store.apply_to(output_df)
         data_handler.write_excel(output_df)
+        result_store.close()
+        manifest.save()
 
         logging.info("数据处理流程完成。")
 
@@ -229,6 +322,32 @@ def process_ppt(rows_to_process=None):
         logging.exception(f"处理过程中发生错误: {e}")
 
 
+def export_results():
+    """
+    不调用任何接口，直接将结果库中已提交的结果导出为输出Excel文件。
+    """
+    try:
+        config = configparser.ConfigParser()
+        config.read('config.ini', encoding='utf-8')
+        setup_logging(config['gen_ppt']['log_file'])
+
+        data_handler = create_data_handler(config)
+        result_store = ResultStore(config['gen_ppt'].get('result_db', fallback=DEFAULT_RESULT_DB))
+
+        output_df = data_handler.read_output_excel()
+        if output_df is None:
+            output_df = data_handler.read_excel().copy()
+            output_df[TEXT_HASH_COLUMN] = output_df['text'].map(text_hash)
+        result_store.apply_to(output_df)
+        data_handler.write_excel(output_df)
+        result_store.close()
+
+        logging.info("结果导出完成。")
+
+    except Exception as e:
+        logging.exception(f"导出结果时发生错误: {e}")
+
+
 if __name__ == "__main__":
     # 开始计时
     start_time = time.time()